@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""Latency benchmark of the AlertRules evaluation
+
+Summary:
+    This script runs RecipexServerApi.match_alert_rules (the evaluation done on each
+    Measurement's write by addMeasurement, addMeasurements and updateMeasurement) over a
+    stream of synthetic readings against a patient with many AlertRules set, and reports
+    the latency added to each write. The rules are read from memcache, so on top of this
+    a write pays a single memcache get plus one batch put when some rule matches.
+    It needs the App Engine SDK libraries (endpoints, protorpc, ndb) on the path.
+
+Usage:
+    python benchmarks/alert_rules.py [number of readings, default 100000] [number of rules, default 50]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+POOL_SIZE = 10000
+
+
+def synthetic_rules(rnd, number):
+    """To build the cached AlertRules of a patient
+
+    :param rnd: The random.Random instance to be used
+    :param number: Number of rules
+    :return: A dictionary like the one returned by RecipexServerApi.get_alert_rules
+    """
+    rules = {}
+    for caregiver_id in range(number):
+        kind = rnd.choice(main.MEASUREMENTS_KIND)
+        name, minimum, maximum = rnd.choice(main.MEASUREMENTS_VALUES[kind])
+        rules.setdefault(kind, []).append((caregiver_id, name, rnd.choice(sorted(main.ALERT_OPERATORS)),
+                                           float(rnd.uniform(minimum, maximum))))
+    return rules
+
+
+def synthetic_measurement(rnd):
+    """To build a random Measurement
+
+    :param rnd: The random.Random instance to be used
+    :return: A Measurement entity
+    """
+    kind = rnd.choice(main.MEASUREMENTS_KIND)
+    measurement = main.Measurement(kind=kind)
+    for name, minimum, maximum in main.MEASUREMENTS_VALUES[kind]:
+        value = rnd.uniform(minimum, maximum)
+        if isinstance(getattr(main.Measurement, name), main.ndb.IntegerProperty):
+            value = int(value)
+        setattr(measurement, name, value)
+    return measurement
+
+
+def run(readings, number_of_rules):
+    rnd = random.Random(42)
+    rules = synthetic_rules(rnd, number_of_rules)
+    pool = [synthetic_measurement(rnd) for _ in range(POOL_SIZE)]
+    match_alert_rules = main.RecipexServerApi.match_alert_rules
+
+    matches = 0
+    start = time.time()
+    for i in range(readings):
+        matches += len(match_alert_rules(rules, pool[i % POOL_SIZE]))
+    elapsed = time.time() - start
+
+    print("Readings evaluated: %d against %d rules (%d alerts)" % (readings, number_of_rules, matches))
+    print("Elapsed: %.2f s" % elapsed)
+    print("Latency: %.2f us per write" % (elapsed * 1000000 / readings))
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 50)
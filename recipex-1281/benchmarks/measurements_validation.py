@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""Throughput benchmark of the Measurements validation
+
+Summary:
+    This script runs RecipexServerApi.check_measurement (the validation shared by
+    addMeasurement, addMeasurements and updateMeasurement) over a stream of
+    synthetic readings of every kind, some of them missing values or out of range.
+    It needs the App Engine SDK libraries (endpoints, protorpc, ndb) on the path.
+
+Usage:
+    python benchmarks/measurements_validation.py [number of readings, default 1000000]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+POOL_SIZE = 10000
+
+
+def synthetic_reading(rnd):
+    """To build a random AddMeasurementMessage
+
+    About 10% of the readings have a missing value and about 10% an out of range one.
+
+    :param rnd: The random.Random instance to be used
+    :return: An AddMeasurementMessage
+    """
+    kind = rnd.choice(main.MEASUREMENTS_KIND)
+    reading = main.AddMeasurementMessage(kind=kind)
+    for name, minimum, maximum in main.MEASUREMENTS_VALUES[kind]:
+        dice = rnd.random()
+        if dice < 0.1:
+            continue
+        value = rnd.uniform(minimum, maximum)
+        if dice < 0.2:
+            value = maximum + 1
+        if isinstance(getattr(main.Measurement, name), main.ndb.IntegerProperty):
+            value = int(value)
+        setattr(reading, name, value)
+    return reading
+
+
+def run(readings):
+    rnd = random.Random(42)
+    pool = [synthetic_reading(rnd) for _ in range(POOL_SIZE)]
+    check_measurement = main.RecipexServerApi.check_measurement
+    measurement = main.Measurement()
+
+    errors = 0
+    start = time.time()
+    for i in range(readings):
+        if check_measurement(pool[i % POOL_SIZE], measurement):
+            errors += 1
+    elapsed = time.time() - start
+
+    print("Readings validated: %d (%d rejected)" % (readings, errors))
+    print("Elapsed: %.2f s" % elapsed)
+    print("Throughput: %.0f readings/s" % (readings / elapsed))
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
@@ -16,15 +16,27 @@
 #
 
 import endpoints
+import webapp2
 from google.appengine.ext.ndb import Key
+from google.appengine.api import memcache
+from google.appengine.api import datastore_errors
+from google.appengine.datastore.datastore_query import Cursor
 from protorpc import messages
 from protorpc import message_types
 from protorpc import remote
 
 from google.appengine.ext import ndb
-
-from datetime import datetime
+from google.appengine.ext import deferred
+
+from array import array
+from datetime import datetime, timedelta
+import calendar
+import csv
+import json
+import math
+import operator
 import pytz
+import StringIO
 
 import logging
 import credentials
@@ -34,6 +46,78 @@ MEASUREMENTS_KIND = ["BP", "HR", "RR", "SpO2", "HGT", "TMP", "PAIN", "CHL"]
 REQUEST_KIND = ["RELATIVE", "CAREGIVER", "PC_PHYSICIAN", "V_NURSE"]
 ROLE_TYPE = ["PATIENT", "CAREGIVER"]
 PRESCRIPTION_KIND = ["PILL", "SACHET", "VIAL", "CREAM", "OTHER"]
+MAX_BULK_MEASUREMENTS = 200
+MEASUREMENT_DEDUPE_HOURS = 24
+# Whether Measurements are also stored by columns (see MeasurementMonth)
+COLUMNAR_MEASUREMENTS = False
+# Whether the whole histories are read by columns: enable it only once migrate_measurements
+# has completed with COLUMNAR_MEASUREMENTS enabled
+COLUMNAR_MEASUREMENTS_READS = False
+MIGRATION_BATCH_SIZE = 500
+EXPORT_FORMAT = ["CSV", "NDJSON"]
+EXPORT_BATCH_SIZE = 500
+# MeasurementMonth entities written into each chunk of an export read by columns
+EXPORT_BATCH_MONTHS = 12
+STATS_TREND_DAYS = 30
+MAX_SERIES_POINTS = 1000
+OVERVIEW_CONCURRENCY = 10
+OVERVIEW_READINGS = 3
+MAX_OVERVIEW_READINGS = 20
+MESSAGES_PAGE_SIZE = 20
+MAX_MESSAGES_PAGE_SIZE = 100
+REQUESTS_PAGE_SIZE = 20
+MAX_REQUESTS_PAGE_SIZE = 100
+# Day and Time given to the Messages sent before they were timestamped (see timestamp_messages)
+LEGACY_MESSAGE_DATE = datetime(2016, 1, 1)
+DELETE_BATCH_SIZE = 500
+# Read Messages older than this many days are moved into MessageArchive entities (see archive_messages)
+ARCHIVE_MESSAGES_DAYS = 90
+# Messages archived by each run of the task (each User's ones within a transaction, at most 500 writes:
+# the archive, plus a delete and a change log entry for each Message)
+ARCHIVE_BATCH_SIZE = 240
+# Messages packed into each MessageArchive before a new one is started (well within the 1MB entity limit)
+ARCHIVE_MAX_MESSAGES = 2000
+CHANGE_KIND = ["MESSAGE", "REQUEST", "PRESCRIPTION"]
+# Requests not answered within this many days are deleted (see cleanup_requests)
+REQUEST_TTL_DAYS = 30
+CHANGE_LOG_DAYS = 30
+CHANGES_PAGE_SIZE = 500
+# Changes newer than this are not returned yet, so that writes still in flight can't be skipped
+CHANGES_SETTLE_SECONDS = 10
+# Messages of a broadcast written by each cross group transaction (at most 25 entity groups, one is the sender's)
+BROADCAST_BATCH_SIZE = 24
+BROADCAST_BATCHES_PER_TASK = 20
+ALERT_OPERATORS = {"<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge}
+ALERT_RULES_CACHE_SECONDS = 3600
+
+# MEASUREMENTS VALUES: for each kind, the (property, minimum, maximum) of its mandatory values
+MEASUREMENTS_VALUES = {
+    "BP": [("systolic", 0, 250), ("diastolic", 0, 250)],
+    "HR": [("bpm", 0, 400)],
+    "RR": [("respirations", 0, 200)],
+    "SpO2": [("spo2", 0, 100)],
+    "HGT": [("hgt", 0, 600)],
+    "TMP": [("degrees", 30, 45)],
+    "PAIN": [("nrs", 0, 10)],
+    "CHL": [("chl_level", 0, 800)]
+}
+
+
+def compile_measurements_specs(measurements_values):
+    """To compile the validation specs of the Measurements
+
+    :param measurements_values: A dictionary like MEASUREMENTS_VALUES
+    :return: A dictionary mapping each kind to a (values, missing message, out of range message) tuple
+    """
+    specs = {}
+    for kind, values in measurements_values.items():
+        if len(values) > 1:
+            specs[kind] = (tuple(values), "Input parameter(s) missing.", "Input parameter(s) out of range.")
+        else:
+            specs[kind] = (tuple(values), "Input parameter missing.", "Input parameter out of range.")
+    return specs
+
+MEASUREMENTS_SPECS = compile_measurements_specs(MEASUREMENTS_VALUES)
 
 # HTTP CODES
 OK = "200 OK"
@@ -169,6 +253,157 @@ class Measurement(ndb.Model):
     calendarId = ndb.StringProperty()
 
 
+class MeasurementDedupe(ndb.Model):
+    """A client side key of an already stored Measurement
+
+    Summary:
+        This class keeps track of the idempotency keys sent by the mobile application
+        along with new measurements, so that retried requests don't store them twice.
+        A key is taken into account for MEASUREMENT_DEDUPE_HOURS since it was first seen,
+        then it's deleted by cleanup_measurement_dedupes.
+        It has a parent relation with the corresponding user's entity.
+
+    Attributes:
+        Inherited:
+            id = Client side key of the Measurement
+            parent = Corresponding User entity
+        User defined:
+            measurement = Key of the stored Measurement entity [REQUIRED]
+            created = Day and Time the key was first seen [REQUIRED]
+    """
+    measurement = ndb.KeyProperty(required=True, indexed=False)
+    created = ndb.DateTimeProperty(required=True)
+
+
+class LatestMeasurements(ndb.Model):
+    """The most recent Measurement of each kind done by a User
+
+    Summary:
+        This class keeps a snapshot of the latest Measurement of each kind done by a user,
+        so that the summary of the user's vital signs costs a single get.
+        It's updated within the same transaction of each Measurement's write.
+        It has a parent relation with the corresponding user's entity (see RecipexServerApi.latest_measurements_key).
+
+    Attributes:
+        Inherited:
+            id = Datastore id of the LatestMeasurements entity
+            parent = Corresponding User entity
+        User defined:
+            measurements = Dictionary keeping, for each kind, the snapshot of the latest Measurement
+    """
+    measurements = ndb.PickleProperty(compressed=True, default={})
+
+
+class MeasurementStats(ndb.Model):
+    """The running statistics of a kind of Measurements done by a User
+
+    Summary:
+        This class keeps, for each value of a kind of Measurements done by a user, the running
+        count, mean and sum of squared deviations (Welford's algorithm) along with the minimum
+        and the maximum, plus the daily sums of the last STATS_TREND_DAYS days for the trend.
+        This way the statistics cost a single get regardless of the size of the history.
+        It's updated within the same transaction of each Measurement's write, which bumps its generation
+        so that a rebuild (scanning the history outside of any transaction) can detect concurrent writes.
+        It has a parent relation with the corresponding user's entity.
+
+    Attributes:
+        Inherited:
+            id = Kind of the Measurements
+            parent = Corresponding User entity
+        User defined:
+            values = Dictionary keeping, for each value of the kind, a [count, mean, m2, minimum, maximum] list
+            days = Dictionary keeping, for each day (as a proleptic Gregorian ordinal),
+                   the [count, sum] list of each value of the kind
+            stale = Boolean value set when the minimum or the maximum may be out of date
+                    (i.e. a Measurement holding one of them was removed) until the entity is rebuilt
+            generation = Integer value incremented by each write of the entity
+    """
+    values = ndb.PickleProperty(compressed=True, default={})
+    days = ndb.PickleProperty(compressed=True, default={})
+    stale = ndb.BooleanProperty(default=False, indexed=False)
+    generation = ndb.IntegerProperty(default=0, indexed=False)
+
+
+class MeasurementMonth(ndb.Model):
+    """The Measurements of a kind done by a User within a month, stored by columns
+
+    Summary:
+        This class packs the Measurements of a kind done by a user within a month into
+        typed arrays, so that the whole history of a kind costs about 12 reads per year.
+        Only the values of the Measurements are kept (i.e. not the notes).
+        Entities are written only if COLUMNAR_MEASUREMENTS is enabled (along with the migration job)
+        and read in place of the Measurements if COLUMNAR_MEASUREMENTS_READS is enabled.
+        It has a parent relation with the corresponding user's entity.
+
+    Attributes:
+        Inherited:
+            id = "<kind>-<YYYYMM>" string of the MeasurementMonth entity
+            parent = Corresponding User entity
+        User defined:
+            kind = Measurements' kind [REQUIRED]
+            month = Measurements' month as a YYYYMM integer [REQUIRED]
+            ids = Datastore ids of the Measurement entities, sorted by Day and Time
+            timestamps = Array of doubles with the UTC timestamps of the Measurements
+            values = Array of doubles with the values of the Measurements, one row per Measurement
+                     with the values ordered as in MEASUREMENTS_VALUES
+    """
+    kind = ndb.StringProperty(required=True)
+    month = ndb.IntegerProperty(required=True)
+    ids = ndb.IntegerProperty(repeated=True, indexed=False)
+    timestamps = ndb.BlobProperty(compressed=True)
+    values = ndb.BlobProperty(compressed=True)
+
+
+class MeasurementExport(ndb.Model):
+    """An export of all the Measurements done by a User
+
+    Summary:
+        This class models the export of the Measurements' history of a user as a file
+        (allowed formats are specified into EXPORT_FORMAT). The file is written by a
+        background task in chunks of EXPORT_BATCH_SIZE Measurements (see MeasurementExportChunk),
+        or of EXPORT_BATCH_MONTHS MeasurementMonth entities if it's read by columns.
+        It has a parent relation with the corresponding user's entity.
+
+    Attributes:
+        Inherited:
+            id = Datastore id of the MeasurementExport entity
+            parent = Corresponding User entity
+        User defined:
+            format = Format of the exported file [REQUIRED]
+            created = Day and Time of the export request [REQUIRED]
+            completed = Boolean value to track if all the chunks have been written [REQUIRED]
+            num_chunks = Number of chunks written so far [REQUIRED]
+            num_measurements = Number of Measurements written so far [REQUIRED]
+            cursor = Urlsafe query cursor to go on writing the next chunk from
+            columnar = Boolean value set if the Measurements are read from the MeasurementMonth entities
+                       (i.e. COLUMNAR_MEASUREMENTS_READS was enabled when the export was requested)
+    """
+    format = ndb.StringProperty(required=True)
+    created = ndb.DateTimeProperty(required=True)
+    completed = ndb.BooleanProperty(required=True)
+    num_chunks = ndb.IntegerProperty(required=True)
+    num_measurements = ndb.IntegerProperty(required=True)
+    cursor = ndb.StringProperty(indexed=False)
+    columnar = ndb.BooleanProperty(default=False, indexed=False)
+
+
+class MeasurementExportChunk(ndb.Model):
+    """A chunk of an exported file of Measurements
+
+    Summary:
+        This class keeps a piece of the file of a MeasurementExport.
+        It has a parent relation with the corresponding MeasurementExport's entity.
+
+    Attributes:
+        Inherited:
+            id = Number of the chunk within the file (starting from 1)
+            parent = Corresponding MeasurementExport entity
+        User defined:
+            data = Content of the chunk (UTF-8 encoded) [REQUIRED]
+    """
+    data = ndb.BlobProperty(required=True, compressed=True)
+
+
 class Message(ndb.Model):
     """A Message sent by a User to another one
 
@@ -187,12 +422,64 @@ class Message(ndb.Model):
             message = Text of the message [REQUIRED]
             has_read = Boolean value to track if the message has been read [REQUIRED]
             measurement = Key of the Measurement entity of the Message
+            created = Day and Time the Message was sent (missing on the Messages sent before
+                      they were timestamped, until timestamp_messages gives them one)
     """
     sender = ndb.KeyProperty(required=True)
     receiver = ndb.KeyProperty(required=True)
     message = ndb.StringProperty(required=True)
     hasRead = ndb.BooleanProperty(required=True)
     measurement = ndb.KeyProperty()
+    created = ndb.DateTimeProperty()
+
+
+class MessageArchive(ndb.Model):
+    """A batch of old Messages received by a User
+
+    Summary:
+        This class packs the read Messages received by a user more than ARCHIVE_MESSAGES_DAYS
+        ago (see archive_messages), so that the Message entities queried by the application stay few.
+        Each run of the task appends to the user's newest archive until it holds ARCHIVE_MAX_MESSAGES.
+        Each Message is kept as a (id, sender key, measurement key, text, Day and Time) tuple,
+        from the newest. It has a parent relation with the corresponding receiver User's entity.
+
+    Attributes:
+        Inherited:
+            id = Datastore id of the MessageArchive entity
+            parent = User's entity of the messages receiver
+        User defined:
+            messages = List of the archived Messages, from the newest [REQUIRED]
+            newest = Day and Time the newest archived Message was sent [REQUIRED]
+    """
+    messages = ndb.PickleProperty(required=True, compressed=True)
+    newest = ndb.DateTimeProperty(required=True)
+
+
+class Broadcast(ndb.Model):
+    """A Message sent by a Caregiver to all his patients
+
+    Summary:
+        This class models a notice sent by a caregiver to all the patients he had when
+        it was sent. A Message entity is written for each patient by a deferred task
+        (see fan_out_broadcast), a batch at a time, along with the progress of the broadcast.
+        It has a parent relation with the corresponding caregiver's User entity.
+
+    Attributes:
+        Inherited:
+            id = Client side key of the Broadcast (so that retried requests don't send it twice)
+            parent = Corresponding caregiver's User entity
+        User defined:
+            message = Text of the message [REQUIRED]
+            receivers = Keys of the patients' User entities
+            sent = Number of receivers the Message has been sent to so far
+            completed = Boolean value to tell if the Message has been sent to all the receivers
+            created = Day and Time the Broadcast was sent
+    """
+    message = ndb.StringProperty(required=True, indexed=False)
+    receivers = ndb.KeyProperty(repeated=True, indexed=False)
+    sent = ndb.IntegerProperty(default=0, indexed=False)
+    completed = ndb.BooleanProperty(default=False, indexed=False)
+    created = ndb.DateTimeProperty(auto_now_add=True)
 
 
 class Request(ndb.Model):
@@ -217,6 +504,8 @@ class Request(ndb.Model):
             caregiver = Key of the Caregiver's entity [REQUIRED IF KIND != RELATIVE]
             isPending = Boolean value to track if the request is pending or not [REQUIRED]
             message = Text message of the Request
+            created = Day and Time the Request was sent (missing on the Requests sent before
+                      they were timestamped, until timestamp_requests gives them one)
     """
     sender = ndb.KeyProperty(required=True)
     receiver = ndb.KeyProperty(required=True)
@@ -226,6 +515,28 @@ class Request(ndb.Model):
     caregiver = ndb.KeyProperty()
     isPending = ndb.BooleanProperty()
     message = ndb.StringProperty()
+    created = ndb.DateTimeProperty()
+
+
+class RequestLock(ndb.Model):
+    """The lock held by a Request between two Users
+
+    Summary:
+        This class makes sure that at most one Request of each kind exists between two users,
+        whatever of the two sent it: its key is derived from the kind and the (unordered) pair of
+        users (see RecipexServerApi.request_lock_key), so that the check is a single get and the lock
+        is created within the same transaction of the Request it refers to.
+        A lock whose Request doesn't exist anymore (e.g. expired) is not taken into account.
+
+    Attributes:
+        Inherited:
+            id = Kind of the Request and ids of the two Users
+        User defined:
+            request = Key of the Request entity holding the lock [REQUIRED]
+            users = Keys of the two User entities [REQUIRED]
+    """
+    request = ndb.KeyProperty(required=True, indexed=False)
+    users = ndb.KeyProperty(repeated=True)
 
 
 class ActiveIngredient(ndb.Model):
@@ -279,6 +590,60 @@ class Prescription(ndb.Model):
     calendarIds = ndb.StringProperty(repeated=True)
 
 
+class ChangeLogEntry(ndb.Model):
+    """A change of the informations of a User
+
+    Summary:
+        This class keeps track of each Message, Request or Prescription of a user
+        that has been added, modified or deleted, so that the mobile application can
+        download only what changed since its last synchronization (see RecipexServerApi.get_changes).
+        Entries are kept for CHANGE_LOG_DAYS.
+        It has a parent relation with the corresponding user's entity.
+
+    Attributes:
+        Inherited:
+            id = Datastore id of the ChangeLogEntry entity
+            parent = Corresponding User entity
+        User defined:
+            kind = Kind of the changed entity (allowed kinds are specified into CHANGE_KIND) [REQUIRED]
+            entity = Key of the changed entity [REQUIRED]
+            deleted = Boolean value to tell if the entity has been deleted
+            created = Day and Time of the change
+    """
+    kind = ndb.StringProperty(required=True, indexed=False)
+    entity = ndb.KeyProperty(required=True, indexed=False)
+    deleted = ndb.BooleanProperty(default=False, indexed=False)
+    created = ndb.DateTimeProperty(auto_now_add=True)
+
+
+class AlertRule(ndb.Model):
+    """An alert on the Measurements of a patient set by one of his Caregivers
+
+    Summary:
+        This class models a threshold on a value of some kind of Measurements (e.g. SpO2 < 90).
+        Each time a Measurement matching the rule is stored a Message linked to it is sent
+        from the patient to the Caregiver. The rules of a patient are cached (see
+        RecipexServerApi.get_alert_rules), so they're evaluated without any Datastore access.
+        It has a parent relation with the corresponding patient's User entity.
+
+    Attributes:
+        Inherited:
+            id = Datastore id of the AlertRule entity
+            parent = Corresponding patient's User entity
+        User defined:
+            caregiver = Key of the User entity of the Caregiver to be alerted [REQUIRED]
+            kind = Measurements' kind [REQUIRED]
+            value = Name of the checked value (as the corresponding Measurement's property) [REQUIRED]
+            operator = Comparison operator (allowed operators are specified into ALERT_OPERATORS) [REQUIRED]
+            threshold = Threshold the value is compared to [REQUIRED]
+    """
+    caregiver = ndb.KeyProperty(required=True)
+    kind = ndb.StringProperty(required=True)
+    value = ndb.StringProperty(required=True)
+    operator = ndb.StringProperty(required=True)
+    threshold = ndb.FloatProperty(required=True)
+
+
 # MESSAGE CLASSES
 class RegisterUserMessage(messages.Message):
     """Message to register a User
@@ -407,7 +772,7 @@ Summary:
         #4  Query all the User's Messages;
         #5  Query all the User's unread Messages;
         #6  Query all the User's Requests;
-        #7  Query all the User's pending Requests;
+        #7  Query, a page at a time, the pending Requests sent by the User;
         #8  Query all the User's Prescriptions;
         #9  Query all the User's unseen Prescriptions;
         #10 Query all the User's current relations with another User;
@@ -416,11 +781,14 @@ Summary:
 Attributes:
     id = Datastore id of the User entity to be queried [REQUIRED]
     profile_id = Datastore id of the User entity to be checked wrt relations info [REQUIRED FOR #10]
-    fetch = Number of entities to be fetched by the query [REQUIRED FOR #3]
-    kind = Kind of entities to be queried [OPTIONAL FOR #3]
+    fetch = Number of entities to be fetched by the query [REQUIRED FOR #3, OPTIONAL FOR #4, #7]
+    kind = Kind of entities to be queried [OPTIONAL FOR #3, #7]
     date_time = Date and time of the last entity returned by the previous query [OPTIONAL FOR #3]
     reverse = Boolean value to specify the order of the entities to be returned by the query [OPTIONAL FOR #3]
     measurement_id = Datastore id of the last Measurement returned by the previous query [REQUIRED FOR #3]
+    cursor = Cursor returned along with the previous page of entities [OPTIONAL FOR #4, #7]
+    pending = Boolean value to keep only the Requests not yet seen (or only the seen ones) [OPTIONAL FOR #7]
+    with_measurement = True to embed a summary of the Measurement of each Message [OPTIONAL FOR #4, #5]
 """
 USER_ID_MESSAGE = endpoints.ResourceContainer(message_types.VoidMessage,
                                               id=messages.IntegerField(2, required=True),
@@ -429,7 +797,10 @@ USER_ID_MESSAGE = endpoints.ResourceContainer(message_types.VoidMessage,
                                               kind=messages.StringField(5),
                                               date_time=messages.StringField(6),
                                               reverse=messages.BooleanField(7),
-                                              measurement_id=messages.IntegerField(8))
+                                              measurement_id=messages.IntegerField(8),
+                                              cursor=messages.StringField(9),
+                                              pending=messages.BooleanField(10),
+                                              with_measurement=messages.BooleanField(11))
 
 
 """Wrapper to update User's reations
@@ -604,6 +975,8 @@ class AddMeasurementMessage(messages.Message):
         chl_level = Cholesterol level [REQUIRED IF KIND = CHL]
         note = Measurement's additional notes by the user
         calendar_id = Google Calendar's id of the measurements event
+        date_time = Client side Day and Time of the Measurement ("%Y-%m-%d %H:%M:%S", Europe/Rome)
+        client_key = Client side idempotency key, to safely retry the request
     """
     kind = messages.StringField(1, required=True)
     # Blood Pressure (BP)
@@ -625,6 +998,8 @@ class AddMeasurementMessage(messages.Message):
     chl_level = messages.FloatField(10)
     note = messages.StringField(11)
     calendarId = messages.StringField(12)
+    date_time = messages.StringField(13)
+    client_key = messages.StringField(14)
 
 
 """Wrapper for AddMeasurementMessage
@@ -640,6 +1015,47 @@ ADD_MEASUREMENT_MESSAGE = endpoints.ResourceContainer(AddMeasurementMessage,
                                                       user_id=messages.IntegerField(2, required=True))
 
 
+class AddMeasurementsMessage(messages.Message):
+    """Message used to add many Measurements at once
+
+    Summary:
+        This message class is intended to add a batch of Measurements
+        buffered by a device (i.e. a sync after some time offline).
+
+    Attributes:
+        measurements = List of AddMeasurementMessage to be added [REQUIRED]
+    """
+    measurements = messages.MessageField(AddMeasurementMessage, 1, repeated=True)
+
+
+"""Wrapper for AddMeasurementsMessage
+
+Summary:
+     ResourceContainer wrapper for an AddMeasurementsMessage
+     to specify needed URL-coded parameters.
+
+Attributes:
+    user_id = Datastore id of the Measurements corresponding User entity [REQUIRED]
+"""
+ADD_MEASUREMENTS_MESSAGE = endpoints.ResourceContainer(AddMeasurementsMessage,
+                                                       user_id=messages.IntegerField(2, required=True))
+
+
+class MeasurementsResultMessage(messages.Message):
+    """Message to return the outcome of a batch of Measurements
+
+    Summary:
+        This message class is intended to return a response for each
+        Measurement of a batch, in the same order they were sent.
+
+    Attributes:
+        results = List of DefaultResponseMessage, one for each Measurement of the batch
+        response = DefaultResponseMessage containing the response
+    """
+    results = messages.MessageField(DefaultResponseMessage, 1, repeated=True)
+    response = messages.MessageField(DefaultResponseMessage, 2)
+
+
 class UpdateMeasurementMessage(messages.Message):
     """Message to update a Measurement
 
@@ -777,6 +1193,234 @@ class UserMeasurementsMessage(messages.Message):
     response = messages.MessageField(DefaultResponseMessage, 2)
 
 
+"""Wrapper to export the Measurements
+
+Summary:
+    ResourceContainer wrapper for an empty message (message_types.VoidMessage)
+    used to start the export of all the Measurements done by a User.
+
+Attributes:
+    id = Datastore id of the User entity [REQUIRED]
+    format = Format of the exported file (allowed formats are specified into EXPORT_FORMAT) [REQUIRED]
+"""
+EXPORT_MEASUREMENTS_MESSAGE = endpoints.ResourceContainer(message_types.VoidMessage,
+                                                          id=messages.IntegerField(2, required=True),
+                                                          format=messages.StringField(3, required=True))
+
+
+"""Wrapper to query an export of the Measurements
+
+Summary:
+    ResourceContainer wrapper for an empty message (message_types.VoidMessage)
+    used to query the status of a Measurements' export along with one of its chunks.
+
+Attributes:
+    user_id = Datastore id of the User entity [REQUIRED]
+    id = Datastore id of the MeasurementExport entity [REQUIRED]
+    chunk = Number of the chunk to be returned (starting from 1)
+"""
+MEASUREMENT_EXPORT_ID_MESSAGE = endpoints.ResourceContainer(message_types.VoidMessage,
+                                                            user_id=messages.IntegerField(2, required=True),
+                                                            id=messages.IntegerField(3, required=True),
+                                                            chunk=messages.IntegerField(4))
+
+
+class MeasurementExportMessage(messages.Message):
+    """Message to return an export of the Measurements
+
+    Summary:
+        This message class is intended to return the status of a Measurements' export
+        along with one of the chunks of the exported file.
+
+    Attributes:
+        id = Datastore id of the MeasurementExport entity
+        format = Format of the exported file
+        completed = Boolean value to tell if all the chunks have been written
+        num_chunks = Number of chunks written so far
+        num_measurements = Number of Measurements written so far
+        chunk = Number of the returned chunk
+        data = Content of the returned chunk
+        response = DefaultResponseMessage containing the response
+    """
+    id = messages.IntegerField(1)
+    format = messages.StringField(2)
+    completed = messages.BooleanField(3)
+    num_chunks = messages.IntegerField(4)
+    num_measurements = messages.IntegerField(5)
+    chunk = messages.IntegerField(6)
+    data = messages.StringField(7)
+    response = messages.MessageField(DefaultResponseMessage, 8)
+
+
+"""Wrapper to query the latest Measurements
+
+Summary:
+    ResourceContainer wrapper for an empty message (message_types.VoidMessage)
+    used to query the most recent Measurement of each kind done by a User.
+
+Attributes:
+    id = Datastore id of the User entity to be queried [REQUIRED]
+"""
+LATEST_MEASUREMENTS_MESSAGE = endpoints.ResourceContainer(message_types.VoidMessage,
+                                                          id=messages.IntegerField(2, required=True))
+
+
+"""Wrapper to query a series of Measurements
+
+Summary:
+    ResourceContainer wrapper for an empty message (message_types.VoidMessage)
+    used to query the values of a kind of Measurements done by a User (e.g. to draw a chart).
+
+Attributes:
+    id = Datastore id of the User entity to be queried [REQUIRED]
+    kind = Kind of the Measurements [REQUIRED]
+    start = Day and Time of the first Measurement to be returned
+    end = Day and Time of the last Measurement to be returned
+    fetch = Maximum number of (most recent) Measurements to be returned (at most MAX_SERIES_POINTS)
+"""
+MEASUREMENT_SERIES_MESSAGE = endpoints.ResourceContainer(message_types.VoidMessage,
+                                                         id=messages.IntegerField(2, required=True),
+                                                         kind=messages.StringField(3, required=True),
+                                                         start=messages.StringField(4),
+                                                         end=messages.StringField(5),
+                                                         fetch=messages.IntegerField(6))
+
+
+class MeasurementSeriesColumnMessage(messages.Message):
+    """Message containing a column of a series of Measurements
+
+    Summary:
+        This message class is used to return the values of a series of Measurements
+        for a single value of their kind (e.g. the systolic pressure).
+
+    Attributes:
+        value = Name of the value (as the corresponding Measurement's property)
+        data = Values of the Measurements, parallel to the series' timestamps
+    """
+    value = messages.StringField(1)
+    data = messages.FloatField(2, repeated=True)
+
+
+class MeasurementSeriesMessage(messages.Message):
+    """Message to return a series of Measurements
+
+    Summary:
+        This message class is intended to return the values of a kind of Measurements
+        as parallel arrays (one for the timestamps and one for each value of the kind),
+        sorted from the oldest to the newest Measurement.
+
+    Attributes:
+        kind = Measurements' kind
+        timestamps = UTC timestamps (seconds since the epoch) of the Measurements
+        columns = List of MeasurementSeriesColumnMessage, one for each value of the kind
+        response = DefaultResponseMessage containing the response
+    """
+    kind = messages.StringField(1)
+    timestamps = messages.IntegerField(2, repeated=True)
+    columns = messages.MessageField(MeasurementSeriesColumnMessage, 3, repeated=True)
+    response = messages.MessageField(DefaultResponseMessage, 4)
+
+
+"""Wrapper to query the statistics of the Measurements
+
+Summary:
+    ResourceContainer wrapper for an empty message (message_types.VoidMessage)
+    used to query the running statistics of the Measurements done by a User.
+
+Attributes:
+    id = Datastore id of the User entity to be queried [REQUIRED]
+    kind = Kind of the Measurements (all the kinds if not specified)
+"""
+MEASUREMENT_STATS_MESSAGE = endpoints.ResourceContainer(message_types.VoidMessage,
+                                                        id=messages.IntegerField(2, required=True),
+                                                        kind=messages.StringField(3))
+
+
+class MeasurementStatsMessage(messages.Message):
+    """Message containing the statistics of a Measurement's value
+
+    Summary:
+        This message class is intended to return the statistics of a single value
+        (e.g. the systolic pressure) of a kind of Measurements done by a User.
+
+    Attributes:
+        kind = Measurements' kind
+        value = Name of the value (as the corresponding Measurement's property)
+        count = Number of Measurements
+        mean = Mean of the value
+        std_dev = Sample standard deviation of the value
+        minimum = Minimum of the value
+        maximum = Maximum of the value
+        trend_mean = Mean of the value within the last STATS_TREND_DAYS days
+        trend = Daily variation of the value within the last STATS_TREND_DAYS days (least squares
+                slope of the daily means)
+    """
+    kind = messages.StringField(1)
+    value = messages.StringField(2)
+    count = messages.IntegerField(3)
+    mean = messages.FloatField(4)
+    std_dev = messages.FloatField(5)
+    minimum = messages.FloatField(6)
+    maximum = messages.FloatField(7)
+    trend_mean = messages.FloatField(8)
+    trend = messages.FloatField(9)
+
+
+class UserMeasurementStatsMessage(messages.Message):
+    """Message to return the statistics of the Measurements
+
+    Summary:
+        This message class is intended to be a wrapper for a response message
+        which returns as additional payload a list of MeasurementStatsMessage.
+
+    Attributes:
+        stats = List of MeasurementStatsMessage to be returned
+        response = DefaultResponseMessage containing the response
+    """
+    stats = messages.MessageField(MeasurementStatsMessage, 1, repeated=True)
+    response = messages.MessageField(DefaultResponseMessage, 2)
+
+
+class PatientOverviewMessage(messages.Message):
+    """Message containing the summary of a patient's vital signs
+
+    Summary:
+        This message class is used to return the latest Measurements done by
+        a patient along with the number of them matching some AlertRule.
+
+    Attributes:
+        id = Datastore id of the patient's User entity
+        name = Name of the patient
+        surname = Surname of the patient
+        pic = URL to the patient's profile pic
+        alerts = Number of the returned Measurements matching some AlertRule
+        measurements = List of MeasurementInfoMessage of the latest patient's Measurements
+    """
+    id = messages.IntegerField(1)
+    name = messages.StringField(2)
+    surname = messages.StringField(3)
+    pic = messages.StringField(4)
+    alerts = messages.IntegerField(5)
+    measurements = messages.MessageField(MeasurementInfoMessage, 6, repeated=True)
+
+
+class CaregiverOverviewMessage(messages.Message):
+    """Message to return the summary of the vital signs of a Caregiver's patients
+
+    Summary:
+        This message class is intended to be a wrapper for a response message which returns
+        as additional payload a list of PatientOverviewMessage, sorted by the number of alerts
+        (then by the Day and Time of the latest Measurement), so that the patients who need
+        attention come first.
+
+    Attributes:
+        patients = List of PatientOverviewMessage to be returned
+        response = DefaultResponseMessage containing the response
+    """
+    patients = messages.MessageField(PatientOverviewMessage, 1, repeated=True)
+    response = messages.MessageField(DefaultResponseMessage, 2)
+
+
 class MessageSendMessage(messages.Message):
     """Message to Send a Message to a User
 
@@ -819,26 +1463,119 @@ Summary:
 Attributes:
     user_id = Datastore id of the corresponding User entity [REQUIRED]
     id = Datastore id of the corresponding Message entity [REQUIRED]
+    with_measurement = True to embed a summary of the Message's Measurement [OPTIONAL FOR #1]
 """
 MESSAGE_ID_MESSAGE = endpoints.ResourceContainer(message_types.VoidMessage,
                                                  user_id=messages.IntegerField(2, required=True),
-                                                 id=messages.IntegerField(3, required=True))
+                                                 id=messages.IntegerField(3, required=True),
+                                                 with_measurement=messages.BooleanField(4))
 
 
-class MessageInfoMessage(messages.Message):
-    """Message to return all Message's informations
+"""Wrapper to query the conversation between two Users
 
-    Summary:
-        This message class is intended to return all the informations
-        stored for a specific Message entity.
+Summary:
+    ResourceContainer wrapper for an empty message (message_types.VoidMessage)
+    used to query, a page at a time, the Messages exchanged between two Users.
 
-    Attributes:
+Attributes:
+    user_id = Datastore id of the User entity [REQUIRED]
+    other_id = Datastore id of the other User entity [REQUIRED]
+    fetch = Number of Messages to be fetched (MESSAGES_PAGE_SIZE if not specified)
+    cursor = Cursor returned along with the previous (i.e. more recent) page of Messages
+    with_measurement = True to embed a summary of the Measurement of each Message
+"""
+THREAD_MESSAGE = endpoints.ResourceContainer(message_types.VoidMessage,
+                                             user_id=messages.IntegerField(2, required=True),
+                                             other_id=messages.IntegerField(3, required=True),
+                                             fetch=messages.IntegerField(4),
+                                             cursor=messages.StringField(5),
+                                             with_measurement=messages.BooleanField(6))
+
+
+class BroadcastSendMessage(messages.Message):
+    """Message to send a Message to all the patients of a Caregiver
+
+    Summary:
+        This message class is intended to send a notice to all the patients
+        of a Caregiver within the application (i.e. create a Broadcast entity).
+
+    Attributes:
+        client_key = Client side key of the Broadcast, to be reused if the request is retried [REQUIRED]
+        message = Text message of the Message entities [REQUIRED]
+    """
+    client_key = messages.StringField(1, required=True)
+    message = messages.StringField(2, required=True)
+
+
+"""Wrapper for BroadcastSendMessage
+
+Summary:
+    ResourceContainer wrapper for a BroadcastSendMessage
+    to specify needed URL-coded parameters.
+
+Attributes:
+    user_id = Datastore id of the caregiver's User entity [REQUIRED]
+"""
+BROADCAST_SEND_MESSAGE = endpoints.ResourceContainer(BroadcastSendMessage,
+                                                     user_id=messages.IntegerField(3, required=True))
+
+
+"""Wrapper to query the progress of a Broadcast
+
+Summary:
+    ResourceContainer wrapper for an empty message (message_types.VoidMessage)
+    used to query the progress of a Broadcast.
+
+Attributes:
+    user_id = Datastore id of the caregiver's User entity [REQUIRED]
+    id = Client side key of the Broadcast [REQUIRED]
+"""
+BROADCAST_ID_MESSAGE = endpoints.ResourceContainer(message_types.VoidMessage,
+                                                   user_id=messages.IntegerField(2, required=True),
+                                                   id=messages.StringField(3, required=True))
+
+
+class BroadcastInfoMessage(messages.Message):
+    """Message to return the progress of a Broadcast
+
+    Summary:
+        This message class is intended to return how many patients
+        have been sent the Message of a Broadcast so far.
+
+    Attributes:
+        id = Client side key of the Broadcast
+        message = Text message of the Broadcast
+        total = Number of receivers of the Broadcast
+        sent = Number of receivers the Message has been sent to so far
+        completed = Boolean value to tell if the Message has been sent to all the receivers
+        response = DefaultResponseMessage containing the response
+    """
+    id = messages.StringField(1)
+    message = messages.StringField(2)
+    total = messages.IntegerField(3)
+    sent = messages.IntegerField(4)
+    completed = messages.BooleanField(5)
+    response = messages.MessageField(DefaultResponseMessage, 6)
+
+
+class MessageInfoMessage(messages.Message):
+    """Message to return all Message's informations
+
+    Summary:
+        This message class is intended to return all the informations
+        stored for a specific Message entity.
+
+    Attributes:
         id = Datastore id of the Message entity
         sender = Datastore id of the User sender entity of the Message
         receiver = Datastore id of the User receiver entity of the Message
         message = Text of the message
         has_read = Boolean value to track if the message has been read
         measurement = Datastore id of the Measurement entity of the Message
+        sender_pic = URL to the profile pic of the User sender of the Message
+        date_time = Day and Time the Message was sent
+        measurement_info = Summary (id, kind, date_time and values) of the Measurement of the Message,
+                           if requested with with_measurement
     """
     id = messages.IntegerField(1)
     sender = messages.IntegerField(2)
@@ -848,6 +1585,8 @@ class MessageInfoMessage(messages.Message):
     measurement = messages.IntegerField(6)
     sender_pic = messages.StringField(7)
     response = messages.MessageField(DefaultResponseMessage, 8)
+    date_time = messages.StringField(9)
+    measurement_info = messages.MessageField(MeasurementInfoMessage, 10)
 
 
 class UserMessagesMessage(messages.Message):
@@ -860,9 +1599,11 @@ class UserMessagesMessage(messages.Message):
     Attributes:
         user_messages = List of MessageInfoMessage to be returned
         response = DefaultResponseMessage containing the response
+        next_cursor = Cursor to query the next page of Messages (None if there are no more Messages)
     """
     user_messages = messages.MessageField(MessageInfoMessage, 1, repeated=True)
     response = messages.MessageField(DefaultResponseMessage, 2)
+    next_cursor = messages.StringField(3)
 
 
 class RequestSendMessage(messages.Message):
@@ -983,9 +1724,11 @@ class UserRequestsMessage(messages.Message):
     Attributes:
         requests = List of RequestInfoMessage to be returned
         response = DefaultResponseMessage containing the response
+        next_cursor = Cursor to retrieve the next page, if any (paginated requests only)
     """
     requests = messages.MessageField(RequestInfoMessage, 1, repeated=True)
     response = messages.MessageField(DefaultResponseMessage, 2)
+    next_cursor = messages.StringField(3)
 
 
 class ActiveIngredientMessage(messages.Message):
@@ -1226,6 +1969,134 @@ class UserUnseenInfoMessage(messages.Message):
     response = messages.MessageField(DefaultResponseMessage, 5)
 
 
+"""Wrapper to query the changes of the User's informations
+
+Summary:
+    ResourceContainer wrapper for an empty message (message_types.VoidMessage)
+    used to query what changed since the last synchronization of a User.
+
+Attributes:
+    id = Datastore id of the User entity to be queried [REQUIRED]
+    token = Token returned by the previous synchronization (a full synchronization is needed if not specified)
+"""
+CHANGES_MESSAGE = endpoints.ResourceContainer(message_types.VoidMessage,
+                                              id=messages.IntegerField(2, required=True),
+                                              token=messages.StringField(3))
+
+
+class ChangeMessage(messages.Message):
+    """Message containing a change of the User's informations
+
+    Summary:
+        This message class is used to return an entity of a User that has been
+        added, modified or deleted since the last synchronization.
+
+    Attributes:
+        kind = Kind of the changed entity (allowed kinds are specified into CHANGE_KIND)
+        id = Datastore id of the changed entity
+        user_id = Datastore id of the User entity the changed entity belongs to
+        deleted = Boolean value to tell if the entity has been deleted
+        date_time = Day and Time of the change
+        message_info = Current informations of the Message [PRESENT IF KIND = MESSAGE AND NOT DELETED]
+        request_info = Current informations of the Request [PRESENT IF KIND = REQUEST AND NOT DELETED]
+        prescription_info = Current informations of the Prescription [PRESENT IF KIND = PRESCRIPTION AND NOT DELETED]
+    """
+    kind = messages.StringField(1)
+    id = messages.IntegerField(2)
+    user_id = messages.IntegerField(3)
+    deleted = messages.BooleanField(4)
+    date_time = messages.StringField(5)
+    message_info = messages.MessageField(MessageInfoMessage, 6)
+    request_info = messages.MessageField(RequestInfoMessage, 7)
+    prescription_info = messages.MessageField(PrescriptionInfoMessage, 8)
+
+
+class UserChangesMessage(messages.Message):
+    """Message to return the changes of the User's informations
+
+    Summary:
+        This message class is intended to be a wrapper for a response message which
+        returns as additional payload a list of ChangeMessage. When a full synchronization
+        is needed (i.e. the given token is missing or expired) the response has doOperation set.
+
+    Attributes:
+        changes = List of ChangeMessage to be returned
+        token = Token to be sent along with the next synchronization (or the next page, if more is set)
+        more = Boolean value to tell if there are more changes to be queried straight away
+        response = DefaultResponseMessage containing the response
+    """
+    changes = messages.MessageField(ChangeMessage, 1, repeated=True)
+    token = messages.StringField(2)
+    more = messages.BooleanField(3)
+    response = messages.MessageField(DefaultResponseMessage, 4)
+
+
+class AlertRuleMessage(messages.Message):
+    """Message containing an AlertRule's informations
+
+    Summary:
+        This message class is used either to add a new AlertRule
+        or to return all the informations of an existing one.
+
+    Attributes:
+        id = Datastore id of the AlertRule entity
+        caregiver = Datastore id of the User entity of the Caregiver to be alerted [REQUIRED]
+        kind = Measurements' kind [REQUIRED]
+        value = Name of the checked value (e.g. spo2, systolic) [REQUIRED]
+        operator = Comparison operator (allowed operators are specified into ALERT_OPERATORS) [REQUIRED]
+        threshold = Threshold the value is compared to [REQUIRED]
+    """
+    id = messages.IntegerField(1)
+    caregiver = messages.IntegerField(2, required=True)
+    kind = messages.StringField(3, required=True)
+    value = messages.StringField(4, required=True)
+    operator = messages.StringField(5, required=True)
+    threshold = messages.FloatField(6, required=True)
+
+
+"""Wrapper to add a new AlertRule
+
+Summary:
+    ResourceContainer wrapper for an AlertRuleMessage intended
+    to add a new AlertRule on the Measurements of a specific User.
+
+Attributes:
+    user_id = Datastore id of the patient's User entity [REQUIRED]
+"""
+ADD_ALERT_RULE_MESSAGE = endpoints.ResourceContainer(AlertRuleMessage,
+                                                     user_id=messages.IntegerField(7, required=True))
+
+
+"""Wrapper to query AlertRule informations
+
+Summary:
+    ResourceContainer wrapper for an empty message (message_types.VoidMessage)
+    used to delete an existing AlertRule.
+
+Attributes:
+    user_id = Datastore id of the patient's User entity [REQUIRED]
+    id = Datastore id of the AlertRule entity [REQUIRED]
+"""
+ALERT_RULE_ID_MESSAGE = endpoints.ResourceContainer(message_types.VoidMessage,
+                                                    user_id=messages.IntegerField(2, required=True),
+                                                    id=messages.IntegerField(3, required=True))
+
+
+class UserAlertRulesMessage(messages.Message):
+    """Message to return a list of AlertRules
+
+    Summary:
+        This message class is intended to be a wrapper for a response message
+        which returns as additional payload a list of AlertRuleMessage.
+
+    Attributes:
+        rules = List of AlertRuleMessage to be returned
+        response = DefaultResponseMessage containing the response
+    """
+    rules = messages.MessageField(AlertRuleMessage, 1, repeated=True)
+    response = messages.MessageField(DefaultResponseMessage, 2)
+
+
 @endpoints.api(name="recipexServerApi", version="v1",
                hostname="recipex-1281.appspot.com",
                allowed_client_ids=[credentials.WEB_CLIENT_ID,
@@ -1603,22 +2474,24 @@ class RecipexServerApi(remote.Service):
         if measurements:
             for measurement in measurements:
                 measurement.key.delete()
-        usr_messages_rcvd = Message.query(ancestor=user.key)
-        if usr_messages_rcvd:
-            for message in usr_messages_rcvd:
-                message.key.delete()
-        usr_messages_sent = Message.query(Message.sender == user.key)
-        if usr_messages_sent:
-            for message in usr_messages_sent:
-                message.key.delete()
+        ndb.delete_multi(MeasurementDedupe.query(ancestor=user.key).fetch(keys_only=True))
+        ndb.delete_multi(MeasurementMonth.query(ancestor=user.key).fetch(keys_only=True))
+        ndb.delete_multi(MeasurementExportChunk.query(ancestor=user.key).fetch(keys_only=True))
+        ndb.delete_multi(MeasurementExport.query(ancestor=user.key).fetch(keys_only=True))
+        RecipexServerApi.latest_measurements_key(user.key).delete()
+        ndb.delete_multi(MeasurementStats.query(ancestor=user.key).fetch(keys_only=True))
+        RecipexServerApi.delete_alert_rules(user.key)
+        RecipexServerApi.delete_all(Message.query(ancestor=user.key))
+        RecipexServerApi.delete_all(Message.query(Message.sender == user.key), change_kind="MESSAGE")
+        RecipexServerApi.delete_all(MessageArchive.query(ancestor=user.key))
+        RecipexServerApi.delete_all(ChangeLogEntry.query(ancestor=user.key))
+        RecipexServerApi.delete_all(Broadcast.query(ancestor=user.key))
         requests_rcvd = Request.query(ancestor=user.key)
         if requests_rcvd:
             for request in requests_rcvd:
                 request.key.delete()
-        requests_sent = Request.query(Request.sender == user.key)
-        if requests_sent:
-            for request in requests_sent:
-                request.key.delete()
+        RecipexServerApi.delete_all(Request.query(Request.sender == user.key), change_kind="REQUEST")
+        RecipexServerApi.delete_all(RequestLock.query(RequestLock.users == user.key))
         prescriptions = Prescription.query(ancestor=user.key)
         if prescriptions:
             for prescription in prescriptions:
@@ -1633,6 +2506,7 @@ class RecipexServerApi(remote.Service):
                         if user.key.id() in patient.caregivers.keys():
                             del patient.caregivers[caregiver.key.id()]
                             patient.put()
+                    RecipexServerApi.delete_alert_rules(caregiver.patients[patient_key], user.key)
             caregiver.key.delete()
 
         user.key.delete()
@@ -1725,6 +2599,8 @@ class RecipexServerApi(remote.Service):
 
             patient.put()
             caregiver.put()
+            if patient.key.id() not in caregiver.patients.keys():
+                RecipexServerApi.delete_alert_rules(patient.key, caregiver.key.parent())
 
         caregiver = Caregiver.query(ancestor=Key(User, request.id)).get()
         relation_caregiver = Caregiver.query(ancestor=Key(User, request.relation_id)).get()
@@ -1864,13 +2740,17 @@ class RecipexServerApi(remote.Service):
                                                     response=DefaultResponseMessage(code=OK,
                                                                                     message="Measurements retrieved.")))
 
-    @endpoints.method(USER_ID_MESSAGE, UserMessagesMessage,
-                      path="recipexServerApi/users/{id}/messages", http_method="GET", name="user.getMessages")
-    def get_messages(self, request):
-        """Retrieve all the Messages received by some User
+    @endpoints.method(EXPORT_MEASUREMENTS_MESSAGE, DefaultResponseMessage,
+                      path="recipexServerApi/users/{id}/measurement-exports", http_method="POST",
+                      name="user.exportMeasurements")
+    def export_measurements(self, request):
+        """Start the export of all the Measurements done by some User
 
-        :param request: A USER_ID_MESSAGE request message
-        :return: A UserMessagesMessage containing all the User's Messages along with the response
+        The file is written in background, chunk by chunk: its progress
+        and its chunks can be retrieved through user.getMeasurementExport.
+
+        :param request: An EXPORT_MEASUREMENTS_MESSAGE request message
+        :return: A DefaultResponseMessage containing the MeasurementExport's Datastore id along with the response
         """
         RecipexServerApi.authentication_check()
 
@@ -1878,258 +2758,660 @@ class RecipexServerApi(remote.Service):
         if not user:
             return RecipexServerApi.return_response(code=NOT_FOUND,
                                                     message="User not existent.",
-                                                    response=UserMessagesMessage(
-                                                        response=DefaultResponseMessage(code=NOT_FOUND,
-                                                                                        message="User not existent.")))
+                                                    response=DefaultResponseMessage(code=NOT_FOUND,
+                                                                                    message="User not existent."))
 
-        messages_entities = Message.query(ancestor=user.key)
+        if request.format not in EXPORT_FORMAT:
+            return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
+                                                    message="Format not existent.",
+                                                    response=DefaultResponseMessage(code=PRECONDITION_FAILED,
+                                                                                    message="Format not existent."))
 
-        user_messages = []
+        export = MeasurementExport(parent=user.key, format=request.format, created=datetime.utcnow(),
+                                   completed=False, num_chunks=0, num_measurements=0,
+                                   columnar=COLUMNAR_MEASUREMENTS_READS)
+        export_key = export.put()
+        deferred.defer(write_measurement_export, export_key, 1)
 
-        for message in messages_entities:
-            sender = message.sender.get()
-            if sender:
-                pic = sender.pic
-            if message.measurement:
-                user_messages.append(MessageInfoMessage(id=message.key.id(), sender=message.sender.id(),
-                                                        receiver=message.receiver.id(), message=message.message,
-                                                        hasRead=message.hasRead, sender_pic=pic,
-                                                        measurement=message.measurement.id()))
-            else:
-                user_messages.append(MessageInfoMessage(id=message.key.id(), sender=message.sender.id(),
-                                                        receiver=message.receiver.id(), message=message.message,
-                                                        sender_pic=pic, hasRead=message.hasRead))
+        return RecipexServerApi.return_response(code=CREATED,
+                                                message="Measurements export started.",
+                                                response=DefaultResponseMessage(code=CREATED,
+                                                                                message="Measurements export started.",
+                                                                                payload=str(export_key.id())))
+
+    @endpoints.method(MEASUREMENT_EXPORT_ID_MESSAGE, MeasurementExportMessage,
+                      path="recipexServerApi/users/{user_id}/measurement-exports/{id}", http_method="GET",
+                      name="user.getMeasurementExport")
+    def get_measurement_export(self, request):
+        """Retrieve the status of an export of the Measurements along with one of its chunks
 
-            if not message.hasRead:
-                message.hasRead = True
-                message.put()
+        :param request: A MEASUREMENT_EXPORT_ID_MESSAGE request message
+        :return: A MeasurementExportMessage containing the export's status and chunk along with the response
+        """
+        RecipexServerApi.authentication_check()
+
+        export_key = Key(User, request.user_id, MeasurementExport, request.id)
+        keys = [export_key]
+        if request.chunk:
+            keys.append(Key(MeasurementExportChunk, request.chunk, parent=export_key))
+        entities = ndb.get_multi(keys)
+        export = entities[0]
+        if not export:
+            return RecipexServerApi.return_response(code=NOT_FOUND,
+                                                    message="Export not existent.",
+                                                    response=MeasurementExportMessage(
+                                                        response=DefaultResponseMessage(code=NOT_FOUND,
+                                                                                        message="Export not existent.")))
+
+        export_info = MeasurementExportMessage(id=export_key.id(), format=export.format, completed=export.completed,
+                                               num_chunks=export.num_chunks, num_measurements=export.num_measurements)
+        if request.chunk:
+            chunk = entities[1]
+            if not chunk:
+                export_info.response = DefaultResponseMessage(code=NOT_FOUND, message="Chunk not existent.")
+                return RecipexServerApi.return_response(code=NOT_FOUND,
+                                                        message="Chunk not existent.",
+                                                        response=export_info)
+            export_info.chunk = request.chunk
+            export_info.data = chunk.data.decode("utf-8")
 
+        export_info.response = DefaultResponseMessage(code=OK, message="Export info retrieved.")
         return RecipexServerApi.return_response(code=OK,
-                                                message="Messages retrieved.",
-                                                response=UserMessagesMessage(
-                                                    user_messages=user_messages,
-                                                    response=DefaultResponseMessage(code=OK,
-                                                                                    message="Messages retrieved.")))
+                                                message="Export info retrieved.",
+                                                response=export_info)
 
-    @endpoints.method(USER_ID_MESSAGE, UserMessagesMessage,
-                      path="recipexServerApi/users/{id}/unread-messages", http_method="GET", name="user.getUnreadMessages")
-    def get_unread_messages(self, request):
-        """Retrieve all the unread Messages of some User
+    @endpoints.method(LATEST_MEASUREMENTS_MESSAGE, UserMeasurementsMessage,
+                      path="recipexServerApi/users/{id}/latest-measurements", http_method="GET",
+                      name="user.getLatestMeasurements")
+    def get_latest_measurements(self, request):
+        """Retrieve the most recent Measurement of each kind done by some User
 
-        :param request: A USER_ID_MESSAGE request message
-        :return: A UserMessagesMessage containing all the User's unread Messages along with the response
+        :param request: A LATEST_MEASUREMENTS_MESSAGE request message
+        :return: A UserMeasurementsMessage containing the latest User's Measurements along with the response
         """
         RecipexServerApi.authentication_check()
 
-        user = Key(User, request.id).get()
+        user_key = Key(User, request.id)
+        user, latest = ndb.get_multi([user_key, RecipexServerApi.latest_measurements_key(user_key)])
         if not user:
             return RecipexServerApi.return_response(code=NOT_FOUND,
                                                     message="User not existent.",
-                                                    response=UserMessagesMessage(
+                                                    response=UserMeasurementsMessage(
                                                         response=DefaultResponseMessage(code=NOT_FOUND,
                                                                                         message="User not existent.")))
 
-        messages_entities = Message.query(ancestor=user.key)
+        if not latest:
+            latest = RecipexServerApi.rebuild_latest_measurements(user_key)
+
+        user_measurements = []
+        for kind in MEASUREMENTS_KIND:
+            snapshot = latest.measurements.get(kind)
+            if snapshot:
+                info = dict(snapshot)
+                info["date_time"] = RecipexServerApi.format_date_time(snapshot["date_time"])
+                user_measurements.append(MeasurementInfoMessage(**info))
+
+        return RecipexServerApi.return_response(code=OK,
+                                                message="Latest measurements retrieved.",
+                                                response=UserMeasurementsMessage(
+                                                    measurements=user_measurements,
+                                                    response=DefaultResponseMessage(code=OK,
+                                                                                    message="Latest measurements retrieved.")))
 
-        user_messages = []
+    @endpoints.method(USER_ID_MESSAGE, CaregiverOverviewMessage,
+                      path="recipexServerApi/users/{id}/patients-overview", http_method="GET",
+                      name="user.getPatientsOverview")
+    def get_patients_overview(self, request):
+        """Retrieve the summary of the vital signs of all the patients of some Caregiver
 
-        for message in messages_entities:
-            if not message.hasRead:
-                sender = message.sender.get()
-                if sender:
-                    pic = sender.pic
-                if message.measurement:
-                    user_messages.append(MessageInfoMessage(id=message.key.id(), sender=message.sender.id(),
-                                                            receiver=message.receiver.id(), message=message.message,
-                                                            hasRead=message.hasRead, sender_pic=pic,
-                                                            measurement=message.measurement.id()))
-                else:
-                    user_messages.append(MessageInfoMessage(id=message.key.id(), sender=message.sender.id(),
-                                                            receiver=message.receiver.id(), message=message.message,
-                                                            sender_pic=pic, hasRead=message.hasRead))
+        The latest Measurements of the patients are queried concurrently, by at most
+        OVERVIEW_CONCURRENCY tasklets, so the latency depends on the concurrency
+        rather than on the number of patients.
+
+        :param request: A USER_ID_MESSAGE request message (fetch and kind are optional)
+        :return: A CaregiverOverviewMessage containing the summary of each patient along with the response
+        """
+        RecipexServerApi.authentication_check()
+
+        caregiver = Caregiver.query(ancestor=Key(User, request.id)).get()
+        if not caregiver:
+            return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
+                                                    message="User not a caregiver.",
+                                                    response=CaregiverOverviewMessage(
+                                                        response=DefaultResponseMessage(code=PRECONDITION_FAILED,
+                                                                                        message="User not a caregiver.")))
+
+        if request.kind and request.kind not in MEASUREMENTS_KIND:
+            return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
+                                                    message="Kind not existent.",
+                                                    response=CaregiverOverviewMessage(
+                                                        response=DefaultResponseMessage(code=PRECONDITION_FAILED,
+                                                                                        message="Kind not existent.")))
+
+        patient_keys = list(caregiver.patients.values())
+        patients_future = ndb.get_multi_async(patient_keys)
+        latest = RecipexServerApi.fetch_latest_readings(patient_keys, request.kind,
+                                                        min(request.fetch or OVERVIEW_READINGS, MAX_OVERVIEW_READINGS))
+
+        overview = []
+        for patient_future in patients_future:
+            patient = patient_future.get_result()
+            if not patient:
+                continue
+            measurements, rules = latest[patient.key]
+            alerts = 0
+            user_measurements = []
+            for measurement in measurements:
+                alerts += len(RecipexServerApi.match_alert_rules(rules, measurement))
+                info = RecipexServerApi.measurement_snapshot(measurement)
+                info["date_time"] = RecipexServerApi.format_date_time(measurement.date_time)
+                user_measurements.append(MeasurementInfoMessage(**info))
+            recency = -RecipexServerApi.to_timestamp(measurements[0].date_time) if measurements else 0
+            overview.append(((-alerts, recency),
+                             PatientOverviewMessage(id=patient.key.id(), name=patient.name, surname=patient.surname,
+                                                    pic=patient.pic, alerts=alerts,
+                                                    measurements=user_measurements)))
+        overview.sort(key=lambda item: item[0])
 
         return RecipexServerApi.return_response(code=OK,
-                                                message="Messages retrieved.",
-                                                response=UserMessagesMessage(
-                                                    user_messages=user_messages,
+                                                message="Patients overview retrieved.",
+                                                response=CaregiverOverviewMessage(
+                                                    patients=[patient for _, patient in overview],
                                                     response=DefaultResponseMessage(code=OK,
-                                                                                    message="Messages retrieved.")))
+                                                                                    message="Patients overview retrieved.")))
 
-    @endpoints.method(USER_ID_MESSAGE, UserRequestsMessage,
-                      path="recipexServerApi/users/{id}/requests", http_method="GET", name="user.getRequests")
-    def get_requests(self, request):
-        """Retrive all the Requests received by some User
+    @endpoints.method(MEASUREMENT_SERIES_MESSAGE, MeasurementSeriesMessage,
+                      path="recipexServerApi/users/{id}/measurement-series", http_method="GET",
+                      name="user.getMeasurementSeries")
+    def get_measurement_series(self, request):
+        """Retrieve the values of a kind of Measurements done by some User
 
-        :param request: A USER_ID_MESSAGE request message
-        :return: A UserRequestsMessage containing all the User's Requests along with the response
+        Only the Day and Time and the values of the Measurements are read, by a projection
+        query, so neither the whole entities nor a MeasurementInfoMessage for each of them
+        are needed.
+
+        :param request: A MEASUREMENT_SERIES_MESSAGE request message
+        :return: A MeasurementSeriesMessage containing the values of the Measurements along with the response
         """
         RecipexServerApi.authentication_check()
 
+        if request.kind not in MEASUREMENTS_KIND:
+            return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
+                                                    message="Kind not existent.",
+                                                    response=MeasurementSeriesMessage(
+                                                        response=DefaultResponseMessage(code=PRECONDITION_FAILED,
+                                                                                        message="Kind not existent.")))
+
         user = Key(User, request.id).get()
         if not user:
             return RecipexServerApi.return_response(code=NOT_FOUND,
                                                     message="User not existent.",
-                                                    response=UserRequestsMessage(
+                                                    response=MeasurementSeriesMessage(
                                                         response=DefaultResponseMessage(code=NOT_FOUND,
                                                                                         message="User not existent.")))
 
-        if request.kind:
-            if request.kind not in REQUEST_KIND:
-                return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
-                                                        message="Kind not existent.",
-                                                        response=UserRequestsMessage(
-                                                            response=DefaultResponseMessage(code=PRECONDITION_FAILED,
-                                                                                            message="Kind not existent.")))
+        measurements = Measurement.query(ancestor=user.key)\
+                                  .filter(Measurement.kind == request.kind)\
+                                  .order(-Measurement.date_time)
+        try:
+            if request.start:
+                measurements = measurements.filter(Measurement.date_time >= RecipexServerApi.parse_date_time(request.start))
+            if request.end:
+                measurements = measurements.filter(Measurement.date_time <= RecipexServerApi.parse_date_time(request.end))
+        except ValueError:
+            return RecipexServerApi.return_response(code=BAD_REQUEST,
+                                                    message="Bad date_time format.",
+                                                    response=MeasurementSeriesMessage(
+                                                        response=DefaultResponseMessage(code=BAD_REQUEST,
+                                                                                        message="Bad date_time format.")))
 
-            request_entities = Request.query(ancestor=user.key).filter(Request.kind == request.kind)
-        else:
-            request_entities = Request.query(ancestor=user.key)
+        if request.fetch is not None and request.fetch < 0:
+            return RecipexServerApi.return_response(code=BAD_REQUEST,
+                                                    message="Bad fetch value.",
+                                                    response=MeasurementSeriesMessage(
+                                                        response=DefaultResponseMessage(code=BAD_REQUEST,
+                                                                                        message="Bad fetch value.")))
 
-        user_requests = []
+        names = [name for name, _, _ in MEASUREMENTS_VALUES[request.kind]]
+        limit = min(request.fetch or MAX_SERIES_POINTS, MAX_SERIES_POINTS)
+        rows = measurements.fetch(limit, projection=[Measurement.date_time] +
+                                                    [getattr(Measurement, name) for name in names])
+        rows.reverse()
 
-        for request in request_entities:
-            sender = request.sender.get()
-            if sender:
-                pic = sender.pic
-                name = sender.name
-                surname = sender.surname
-                mail = sender.email
-            if request.kind == "RELATIVE":
-                user_requests.append(RequestInfoMessage(id=request.key.id(), receiver=request.receiver.id(),
-                                                        sender=request.sender.id(), message=request.message,
-                                                        kind=request.kind, role=request.role, sender_pic=pic,
-                                                        sender_name=name, sender_surname=surname, sender_mail=mail,
-                                                        calendarId=request.calendarId, pending=request.isPending))
-            else:
-                user_requests.append(RequestInfoMessage(id=request.key.id(), receiver=request.receiver.id(),
-                                                        sender=request.sender.id(), message=request.message,
-                                                        kind=request.kind, role=request.role, sender_pic=pic,
-                                                        sender_name=name, sender_surname=surname, sender_mail=mail,
-                                                        pending=request.isPending, calendarId=request.calendarId,
-                                                        caregiver=request.caregiver.id()))
-            if request.isPending:
-                request.isPending = False
-                request.put()
+        timestamps = [int(RecipexServerApi.to_timestamp(row.date_time)) for row in rows]
+        columns = [MeasurementSeriesColumnMessage(value=name, data=[float(getattr(row, name)) for row in rows])
+                   for name in names]
 
         return RecipexServerApi.return_response(code=OK,
-                                                message="Requests retrieved.",
-                                                response=UserRequestsMessage(
-                                                    requests=user_requests,
+                                                message="Measurement series retrieved.",
+                                                response=MeasurementSeriesMessage(
+                                                    kind=request.kind, timestamps=timestamps, columns=columns,
                                                     response=DefaultResponseMessage(code=OK,
-                                                                                    message="Requests retrieved.")))
+                                                                                    message="Measurement series retrieved.")))
 
-    @endpoints.method(USER_ID_MESSAGE, UserRequestsMessage,
-                      path="recipexServerApi/users/{id}/requests-pending", http_method="GET", name="user.getRequestsPending")
-    def get_requests_pending(self, request):
-        """Retrieve all the pending Request of some User
+    @endpoints.method(MEASUREMENT_STATS_MESSAGE, UserMeasurementStatsMessage,
+                      path="recipexServerApi/users/{id}/measurement-stats", http_method="GET",
+                      name="user.getMeasurementStats")
+    def get_measurement_stats(self, request):
+        """Retrieve the statistics of the Measurements done by some User
 
-        :param request: A USER_ID_MESSAGE request message
-        :return: A UserRequestsMessage containing all the User's pending Requests along with the response
+        The statistics are kept up to date by each Measurement's write (see MeasurementStats),
+        so their cost doesn't depend on the number of Measurements.
+
+        :param request: A MEASUREMENT_STATS_MESSAGE request message
+        :return: A UserMeasurementStatsMessage containing the statistics along with the response
         """
         RecipexServerApi.authentication_check()
 
-        user = Key(User, request.id).get()
-        if not user:
+        if request.kind is not None and request.kind not in MEASUREMENTS_KIND:
+            return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
+                                                    message="Measurement kind not existent.",
+                                                    response=UserMeasurementStatsMessage(
+                                                        response=DefaultResponseMessage(code=PRECONDITION_FAILED,
+                                                                                        message="Measurement kind not existent.")))
+
+        user_key = Key(User, request.id)
+        kinds = [request.kind] if request.kind else MEASUREMENTS_KIND
+        entities = ndb.get_multi([user_key] + [Key(MeasurementStats, kind, parent=user_key) for kind in kinds])
+        if not entities[0]:
             return RecipexServerApi.return_response(code=NOT_FOUND,
                                                     message="User not existent.",
-                                                    response=UserRequestsMessage(
+                                                    response=UserMeasurementStatsMessage(
                                                         response=DefaultResponseMessage(code=NOT_FOUND,
                                                                                         message="User not existent.")))
 
-        if request.kind:
-            if request.kind not in REQUEST_KIND:
-                return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
-                                                        message="Kind not existent.",
-                                                        response=UserRequestsMessage(
-                                                            response=DefaultResponseMessage(
-                                                                code=PRECONDITION_FAILED,
-                                                                message="Kind not existent.")))
-
-            request_entities = Request.query(ndb.AND(Request.sender == user.key,
-                                                     Request.kind == request.kind))
-        else:
-            request_entities = Request.query(Request.sender == user.key)
-
-        user_requests = []
-
-        for request in request_entities:
-            sender = request.sender.get()
-            if sender:
-                pic = sender.pic
-                name = sender.name
-                surname = sender.surname
-            if request.kind == "RELATIVE":
-                user_requests.append(RequestInfoMessage(id=request.key.id(), receiver=request.receiver.id(),
-                                                        sender=request.sender.id(), message=request.message,
-                                                        kind=request.kind, role=request.role, sender_name=name,
-                                                        sender_surname=surname, sender_pic=pic,
-                                                        calendarId=request.calendarId, pending=request.isPending))
-            else:
-                user_requests.append(RequestInfoMessage(id=request.key.id(), receiver=request.receiver.id(),
-                                                        sender=request.sender.id(), message=request.message,
-                                                        kind=request.kind, role=request.role, sender_pic=pic,
-                                                        sender_name=name, sender_surname=surname,
-                                                        pending=request.isPending, calendarId=request.calendarId,
-                                                        caregiver=request.caregiver.id()))
+        first_day = datetime.utcnow().date().toordinal() - STATS_TREND_DAYS + 1
+        user_stats = []
+        for kind, stats in zip(kinds, entities[1:]):
+            if not stats:
+                continue
+            for name, _, _ in MEASUREMENTS_VALUES[kind]:
+                count, mean, m2, minimum, maximum = stats.values.get(name, [0, 0.0, 0.0, None, None])
+                if not count:
+                    continue
+                trend_mean, trend = RecipexServerApi.measurement_stats_trend(stats, name, first_day)
+                user_stats.append(MeasurementStatsMessage(kind=kind, value=name, count=count, mean=mean,
+                                                          std_dev=(m2 / (count - 1)) ** 0.5 if count > 1 else 0.0,
+                                                          minimum=float(minimum), maximum=float(maximum),
+                                                          trend_mean=trend_mean, trend=trend))
 
         return RecipexServerApi.return_response(code=OK,
-                                                message="Requests retrieved.",
-                                                response=UserRequestsMessage(
-                                                    requests=user_requests,
+                                                message="Measurement stats retrieved.",
+                                                response=UserMeasurementStatsMessage(
+                                                    stats=user_stats,
                                                     response=DefaultResponseMessage(code=OK,
-                                                                                    message="Requests retrieved.")))
+                                                                                    message="Measurement stats retrieved.")))
 
-    @endpoints.method(USER_ID_MESSAGE, UserPrescriptionsMessage,
-                      path="recipexServerApi/users/{id}/prescriptions", http_method="GET",
-                      name="user.getPrescriptions")
-    def get_prescriptions(self, request):
-        """Retrieve all the Prescriptions of some User
+    @endpoints.method(USER_ID_MESSAGE, UserMessagesMessage,
+                      path="recipexServerApi/users/{id}/messages", http_method="GET", name="user.getMessages")
+    def get_messages(self, request):
+        """Retrieve the Messages received by some User, from the newest, a page at a time
 
-        :param request: A USER_ID_MESSAGE request message
-        :return: A UserPrescriptionsMessage containing all the User's Prescriptions along with the response
+        :param request: A USER_ID_MESSAGE request message (fetch, cursor and with_measurement are optional)
+        :return: A UserMessagesMessage containing a page of the User's Messages along with the response
         """
+        RecipexServerApi.authentication_check()
+
         user = Key(User, request.id).get()
         if not user:
             return RecipexServerApi.return_response(code=NOT_FOUND,
                                                     message="User not existent.",
-                                                    response=UserPrescriptionsMessage(
+                                                    response=UserMessagesMessage(
                                                         response=DefaultResponseMessage(code=NOT_FOUND,
                                                                                         message="User not existent.")))
 
-        user_prescriptions = []
-        prescriptions = Prescription.query(ancestor=user.key).order(Prescription.name)
-        for prescription in prescriptions:
-            prescription_info = PrescriptionInfoMessage(id=prescription.key.id(),
-                                                        name=prescription.name,
-                                                        active_ingr_key=prescription.active_ingr_key.id(),
-                                                        active_ingr_name=prescription.active_ingr_name,
-                                                        kind=prescription.kind,
-                                                        dose=prescription.dose, units=prescription.units,
-                                                        quantity=prescription.quantity, seen=prescription.seen,
-                                                        recipe=prescription.recipe, pil=prescription.pil,
-                                                        calendarIds=prescription.calendarIds,
+        try:
+            start_cursor = Cursor(urlsafe=request.cursor) if request.cursor else None
+        except datastore_errors.BadValueError:
+            return RecipexServerApi.return_response(code=BAD_REQUEST,
+                                                    message="Bad cursor.",
+                                                    response=UserMessagesMessage(
+                                                        response=DefaultResponseMessage(code=BAD_REQUEST,
+                                                                                        message="Bad cursor.")))
+
+        page_size = min(request.fetch or MESSAGES_PAGE_SIZE, MAX_MESSAGES_PAGE_SIZE)
+        messages_entities, next_cursor, more = Message.query(ancestor=user.key)\
+                                                      .order(-Message.created)\
+                                                      .fetch_page(page_size, start_cursor=start_cursor)
+        unread_keys, put_futures = RecipexServerApi.set_flag_async(messages_entities, "hasRead", "MESSAGE")
+        user_messages = RecipexServerApi.messages_info(messages_entities, with_measurement=request.with_measurement)
+        for user_message, message in zip(user_messages, messages_entities):
+            user_message.hasRead = message.key not in unread_keys
+
+        for future in put_futures:
+            future.get_result()
+        return RecipexServerApi.return_response(code=OK,
+                                                message="Messages retrieved.",
+                                                response=UserMessagesMessage(
+                                                    user_messages=user_messages,
+                                                    next_cursor=next_cursor.urlsafe() if more and next_cursor else None,
+                                                    response=DefaultResponseMessage(code=OK,
+                                                                                    message="Messages retrieved.")))
+
+    @endpoints.method(CHANGES_MESSAGE, UserChangesMessage,
+                      path="recipexServerApi/users/{id}/changes", http_method="GET", name="user.getChanges")
+    def get_changes(self, request):
+        """Retrieve the Messages, Requests and Prescriptions of some User changed since the last synchronization
+
+        The changes are read from the User's change log (see ChangeLogEntry) by a single
+        indexed query, a page at a time, and each of them carries the current informations
+        of the changed entity, fetched with a single batch get. If the token is missing or
+        older than CHANGE_LOG_DAYS the response has doOperation set, meaning that a full
+        synchronization is needed.
+
+        :param request: A CHANGES_MESSAGE request message
+        :return: A UserChangesMessage containing the changes along with the response
+        """
+        RecipexServerApi.authentication_check()
+
+        user = Key(User, request.id).get()
+        if not user:
+            return RecipexServerApi.return_response(code=NOT_FOUND,
+                                                    message="User not existent.",
+                                                    response=UserChangesMessage(
+                                                        response=DefaultResponseMessage(code=NOT_FOUND,
+                                                                                        message="User not existent.")))
+
+        now = datetime.utcnow()
+        until = now - timedelta(seconds=CHANGES_SETTLE_SECONDS)
+        since = None
+        start_cursor = None
+        if request.token:
+            try:
+                since, page_until, start_cursor = RecipexServerApi.parse_change_token(request.token)
+            except (ValueError, OverflowError, datastore_errors.BadValueError):
+                return RecipexServerApi.return_response(code=BAD_REQUEST,
+                                                        message="Bad token.",
+                                                        response=UserChangesMessage(
+                                                            response=DefaultResponseMessage(code=BAD_REQUEST,
+                                                                                            message="Bad token.")))
+
+        if since is None or since < now - timedelta(days=CHANGE_LOG_DAYS):
+            return RecipexServerApi.return_response(code=OK,
+                                                    message="Full synchronization needed.",
+                                                    response=UserChangesMessage(
+                                                        token=RecipexServerApi.change_token(until),
                                                         response=DefaultResponseMessage(code=OK,
-                                                                                        message="Prescription info retrieved."))
+                                                                                        message="Full synchronization needed.",
+                                                                                        doOperation=True)))
+
+        # The following pages of a synchronization repeat the same query, going on from its cursor
+        if start_cursor:
+            until = page_until
+        entries, next_cursor, more = ChangeLogEntry.query(ancestor=user.key)\
+                                                   .filter(ChangeLogEntry.created > since)\
+                                                   .filter(ChangeLogEntry.created <= until)\
+                                                   .order(ChangeLogEntry.created)\
+                                                   .fetch_page(CHANGES_PAGE_SIZE, start_cursor=start_cursor)
+        more = bool(more and next_cursor)
+
+        last_entries = {}
+        for entry in entries:
+            last_entries[entry.entity] = entry
+        entries = [entry for entry in entries if last_entries[entry.entity] is entry]
+        changes = RecipexServerApi.changes_info(user, entries)
+
+        if more:
+            token = RecipexServerApi.change_token(since, until, next_cursor)
+        else:
+            token = RecipexServerApi.change_token(until)
 
-            prescription.seen = True
-            prescription.put()
+        return RecipexServerApi.return_response(code=OK,
+                                                message="Changes retrieved.",
+                                                response=UserChangesMessage(
+                                                    changes=changes,
+                                                    token=token,
+                                                    more=more,
+                                                    response=DefaultResponseMessage(code=OK,
+                                                                                    message="Changes retrieved.")))
 
-            if prescription.caregiver is not None:
-                user_caregiver = prescription.caregiver.parent().get()
-                prescription_info.caregiver_user_id = user_caregiver.key.id()
-                prescription_info.caregiver_id = prescription.caregiver.id()
-                prescription_info.caregiver_name = user_caregiver.name
-                prescription_info.caregiver_surname = user_caregiver.surname
-                prescription_info.caregiver_mail = user_caregiver.email
-                if user.pc_physician == prescription.caregiver:
-                    prescription_info.caregiver_job = "PC_PHYSICIAN"
-                elif user.visiting_nurse == prescription.caregiver:
-                    prescription_info.caregiver_job = "V_NURSE"
-                else:
-                    prescription_info.caregiver_job = "CAREGIVER"
+    @endpoints.method(USER_ID_MESSAGE, UserMessagesMessage,
+                      path="recipexServerApi/users/{id}/sent-messages", http_method="GET", name="user.getSentMessages")
+    def get_sent_messages(self, request):
+        """Retrieve the Messages sent by some User, from the newest, a page at a time
+
+        :param request: A USER_ID_MESSAGE request message (fetch and cursor are optional)
+        :return: A UserMessagesMessage containing a page of the User's sent Messages along with the response
+        """
+        RecipexServerApi.authentication_check()
+
+        user = Key(User, request.id).get()
+        if not user:
+            return RecipexServerApi.return_response(code=NOT_FOUND,
+                                                    message="User not existent.",
+                                                    response=UserMessagesMessage(
+                                                        response=DefaultResponseMessage(code=NOT_FOUND,
+                                                                                        message="User not existent.")))
+
+        try:
+            start_cursor = Cursor(urlsafe=request.cursor) if request.cursor else None
+        except datastore_errors.BadValueError:
+            return RecipexServerApi.return_response(code=BAD_REQUEST,
+                                                    message="Bad cursor.",
+                                                    response=UserMessagesMessage(
+                                                        response=DefaultResponseMessage(code=BAD_REQUEST,
+                                                                                        message="Bad cursor.")))
+
+        page_size = min(request.fetch or MESSAGES_PAGE_SIZE, MAX_MESSAGES_PAGE_SIZE)
+        messages_entities, next_cursor, more = Message.query(Message.sender == user.key)\
+                                                      .order(-Message.created)\
+                                                      .fetch_page(page_size, start_cursor=start_cursor)
+
+        return RecipexServerApi.return_response(code=OK,
+                                                message="Sent messages retrieved.",
+                                                response=UserMessagesMessage(
+                                                    user_messages=RecipexServerApi.messages_info(
+                                                        messages_entities, with_measurement=request.with_measurement),
+                                                    next_cursor=next_cursor.urlsafe() if more and next_cursor else None,
+                                                    response=DefaultResponseMessage(code=OK,
+                                                                                    message="Sent messages retrieved.")))
+
+    @endpoints.method(USER_ID_MESSAGE, UserMessagesMessage,
+                      path="recipexServerApi/users/{id}/archived-messages", http_method="GET",
+                      name="user.getArchivedMessages")
+    def get_archived_messages(self, request):
+        """Retrieve the archived Messages of some User, from the newest, an archive at a time
+
+        Only the MessageArchive entity of the requested page is read.
+
+        :param request: A USER_ID_MESSAGE request message (cursor is optional)
+        :return: A UserMessagesMessage containing the Messages of an archive along with the response
+        """
+        RecipexServerApi.authentication_check()
+
+        user = Key(User, request.id).get()
+        if not user:
+            return RecipexServerApi.return_response(code=NOT_FOUND,
+                                                    message="User not existent.",
+                                                    response=UserMessagesMessage(
+                                                        response=DefaultResponseMessage(code=NOT_FOUND,
+                                                                                        message="User not existent.")))
+
+        try:
+            start_cursor = Cursor(urlsafe=request.cursor) if request.cursor else None
+        except datastore_errors.BadValueError:
+            return RecipexServerApi.return_response(code=BAD_REQUEST,
+                                                    message="Bad cursor.",
+                                                    response=UserMessagesMessage(
+                                                        response=DefaultResponseMessage(code=BAD_REQUEST,
+                                                                                        message="Bad cursor.")))
+
+        archives, next_cursor, more = MessageArchive.query(ancestor=user.key)\
+                                                    .order(-MessageArchive.newest)\
+                                                    .fetch_page(1, start_cursor=start_cursor)
+        message_entities = []
+        for archive in archives:
+            message_entities.extend(RecipexServerApi.archived_messages(archive))
+
+        return RecipexServerApi.return_response(code=OK,
+                                                message="Archived messages retrieved.",
+                                                response=UserMessagesMessage(
+                                                    user_messages=RecipexServerApi.messages_info(
+                                                        message_entities, with_measurement=request.with_measurement),
+                                                    next_cursor=next_cursor.urlsafe() if more and next_cursor else None,
+                                                    response=DefaultResponseMessage(code=OK,
+                                                                                    message="Archived messages retrieved.")))
+
+    @endpoints.method(USER_ID_MESSAGE, UserMessagesMessage,
+                      path="recipexServerApi/users/{id}/unread-messages", http_method="GET", name="user.getUnreadMessages")
+    def get_unread_messages(self, request):
+        """Retrieve all the unread Messages of some User, from the newest
+
+        Only the unread Messages are read, by an indexed query, so the cost doesn't
+        depend on the number of Messages already read.
+
+        :param request: A USER_ID_MESSAGE request message
+        :return: A UserMessagesMessage containing all the User's unread Messages along with the response
+        """
+        RecipexServerApi.authentication_check()
+
+        user = Key(User, request.id).get()
+        if not user:
+            return RecipexServerApi.return_response(code=NOT_FOUND,
+                                                    message="User not existent.",
+                                                    response=UserMessagesMessage(
+                                                        response=DefaultResponseMessage(code=NOT_FOUND,
+                                                                                        message="User not existent.")))
+
+        messages_entities = RecipexServerApi.unread_messages_query(user.key).fetch()
+        user_messages = RecipexServerApi.messages_info(messages_entities, with_measurement=request.with_measurement)
+
+        return RecipexServerApi.return_response(code=OK,
+                                                message="Messages retrieved.",
+                                                response=UserMessagesMessage(
+                                                    user_messages=user_messages,
+                                                    response=DefaultResponseMessage(code=OK,
+                                                                                    message="Messages retrieved.")))
+
+    @endpoints.method(USER_ID_MESSAGE, UserRequestsMessage,
+                      path="recipexServerApi/users/{id}/requests", http_method="GET", name="user.getRequests")
+    def get_requests(self, request):
+        """Retrive all the Requests received by some User
+
+        :param request: A USER_ID_MESSAGE request message
+        :return: A UserRequestsMessage containing all the User's Requests along with the response
+        """
+        RecipexServerApi.authentication_check()
+
+        user = Key(User, request.id).get()
+        if not user:
+            return RecipexServerApi.return_response(code=NOT_FOUND,
+                                                    message="User not existent.",
+                                                    response=UserRequestsMessage(
+                                                        response=DefaultResponseMessage(code=NOT_FOUND,
+                                                                                        message="User not existent.")))
+
+        if request.kind:
+            if request.kind not in REQUEST_KIND:
+                return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
+                                                        message="Kind not existent.",
+                                                        response=UserRequestsMessage(
+                                                            response=DefaultResponseMessage(code=PRECONDITION_FAILED,
+                                                                                            message="Kind not existent.")))
+
+            request_entities = Request.query(ancestor=user.key).filter(Request.kind == request.kind).fetch()
+        else:
+            request_entities = Request.query(ancestor=user.key).fetch()
+
+        user_requests = RecipexServerApi.requests_info(request_entities)
+
+        pending = [usr_request for usr_request in request_entities if usr_request.isPending]
+        for usr_request in pending:
+            usr_request.isPending = False
+        ndb.put_multi(pending + RecipexServerApi.change_log_entries(
+            "REQUEST", [usr_request.key for usr_request in pending],
+            also_notify=[usr_request.sender for usr_request in pending]))
+
+        return RecipexServerApi.return_response(code=OK,
+                                                message="Requests retrieved.",
+                                                response=UserRequestsMessage(
+                                                    requests=user_requests,
+                                                    response=DefaultResponseMessage(code=OK,
+                                                                                    message="Requests retrieved.")))
+
+    @endpoints.method(USER_ID_MESSAGE, UserRequestsMessage,
+                      path="recipexServerApi/users/{id}/requests-pending", http_method="GET", name="user.getRequestsPending")
+    def get_requests_pending(self, request):
+        """Retrieve the pending Requests sent by some User, a page at a time
+
+        The Requests can be filtered by kind and by their isPending flag (i.e. whether
+        the receiver has seen them or not), both within the query.
+
+        :param request: A USER_ID_MESSAGE request message (kind, pending, fetch and cursor are optional)
+        :return: A UserRequestsMessage containing a page of the User's pending Requests along with the response
+        """
+        RecipexServerApi.authentication_check()
+
+        user = Key(User, request.id).get()
+        if not user:
+            return RecipexServerApi.return_response(code=NOT_FOUND,
+                                                    message="User not existent.",
+                                                    response=UserRequestsMessage(
+                                                        response=DefaultResponseMessage(code=NOT_FOUND,
+                                                                                        message="User not existent.")))
+
+        if request.kind:
+            if request.kind not in REQUEST_KIND:
+                return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
+                                                        message="Kind not existent.",
+                                                        response=UserRequestsMessage(
+                                                            response=DefaultResponseMessage(
+                                                                code=PRECONDITION_FAILED,
+                                                                message="Kind not existent.")))
+
+        try:
+            start_cursor = Cursor(urlsafe=request.cursor) if request.cursor else None
+        except datastore_errors.BadValueError:
+            return RecipexServerApi.return_response(code=BAD_REQUEST,
+                                                    message="Bad cursor.",
+                                                    response=UserRequestsMessage(
+                                                        response=DefaultResponseMessage(code=BAD_REQUEST,
+                                                                                        message="Bad cursor.")))
+
+        query = Request.query(Request.sender == user.key)
+        if request.kind:
+            query = query.filter(Request.kind == request.kind)
+        if request.pending is not None:
+            query = query.filter(Request.isPending == request.pending)
+
+        page_size = min(request.fetch or REQUESTS_PAGE_SIZE, MAX_REQUESTS_PAGE_SIZE)
+        request_entities, next_cursor, more = query.fetch_page(page_size, start_cursor=start_cursor)
+
+        user_requests = RecipexServerApi.requests_info(request_entities, senders={user.key: user})
+
+        return RecipexServerApi.return_response(code=OK,
+                                                message="Requests retrieved.",
+                                                response=UserRequestsMessage(
+                                                    requests=user_requests,
+                                                    next_cursor=next_cursor.urlsafe() if more and next_cursor else None,
+                                                    response=DefaultResponseMessage(code=OK,
+                                                                                    message="Requests retrieved.")))
+
+    @endpoints.method(USER_ID_MESSAGE, UserPrescriptionsMessage,
+                      path="recipexServerApi/users/{id}/prescriptions", http_method="GET",
+                      name="user.getPrescriptions")
+    def get_prescriptions(self, request):
+        """Retrieve all the Prescriptions of some User
+
+        :param request: A USER_ID_MESSAGE request message
+        :return: A UserPrescriptionsMessage containing all the User's Prescriptions along with the response
+        """
+        user = Key(User, request.id).get()
+        if not user:
+            return RecipexServerApi.return_response(code=NOT_FOUND,
+                                                    message="User not existent.",
+                                                    response=UserPrescriptionsMessage(
+                                                        response=DefaultResponseMessage(code=NOT_FOUND,
+                                                                                        message="User not existent.")))
 
-            user_prescriptions.append(prescription_info)
+        prescriptions = Prescription.query(ancestor=user.key).order(Prescription.name).fetch()
+        unseen_keys, put_futures = RecipexServerApi.set_flag_async(prescriptions, "seen", "PRESCRIPTION")
+        user_prescriptions = RecipexServerApi.prescriptions_info(user, prescriptions)
+        for prescription_info, prescription in zip(user_prescriptions, prescriptions):
+            prescription_info.seen = prescription.key not in unseen_keys
 
+        for future in put_futures:
+            future.get_result()
         return RecipexServerApi.return_response(code=OK,
                                                 message="Prescriptions retrieved.",
                                                 response=UserPrescriptionsMessage(
@@ -2200,7 +3482,7 @@ class RecipexServerApi(remote.Service):
         :param request: A USER_ID_MESSAGE request message
         :return: A UserRelationsMessage containing the current relations status along with the response
         """
-        user = Key(User, request.id).get()
+        user, profile_user = ndb.get_multi([Key(User, request.id), Key(User, request.profile_id)])
         if not user:
             return RecipexServerApi.return_response(code=NOT_FOUND,
                                                     message="User not existent.",
@@ -2208,7 +3490,6 @@ class RecipexServerApi(remote.Service):
                                                         response=DefaultResponseMessage(code=NOT_FOUND,
                                                                                         message="User not existent.")))
 
-        profile_user = Key(User, request.profile_id).get()
         if not profile_user:
             return RecipexServerApi.return_response(code=NOT_FOUND,
                                                     message="Profile user not existent.",
@@ -2221,57 +3502,63 @@ class RecipexServerApi(remote.Service):
                                       is_caregiver_request=False, is_patient=False, is_patient_request=False,
                                       profile_mail=profile_user.email)
 
-        old_request_prof = Request.query(ancestor=profile_user.key).filter(Request.sender == user.key)
-        old_request_user = Request.query(ancestor=user.key).filter(Request.sender == profile_user.key)
+        # Every Request between the two Users, in both directions, and their Caregiver profiles are fetched
+        # concurrently, then the Requests are classified by kind in memory
+        old_request_prof_future = Request.query(ancestor=profile_user.key).filter(
+            Request.sender == user.key).fetch_async()
+        old_request_user_future = Request.query(ancestor=user.key).filter(
+            Request.sender == profile_user.key).fetch_async()
+        profile_caregiver_future = Caregiver.query(ancestor=profile_user.key).get_async(keys_only=True)
+        user_caregiver_future = Caregiver.query(ancestor=user.key).get_async(keys_only=True)
+
+        old_request_prof = set(old_request.kind for old_request in old_request_prof_future.get_result())
+        old_request_user = set(old_request.kind for old_request in old_request_user_future.get_result())
+        profile_caregiver = profile_caregiver_future.get_result()
+        user_caregiver = user_caregiver_future.get_result()
 
         if profile_user.key.id() in user.relatives.keys():
             answer.is_relative = True
-        elif old_request_prof.filter(Request.kind == "RELATIVE").get() or\
-                old_request_user.filter(Request.kind == "RELATIVE").get():
+        elif "RELATIVE" in old_request_prof or "RELATIVE" in old_request_user:
             answer.is_relative = True
             answer.is_relative_request = True
         else:
             answer.is_relative = False
 
-        profile_caregiver = Caregiver.query(ancestor=profile_user.key).get()
-
         if profile_caregiver is not None:
-            if user.pc_physician == profile_caregiver.key:
+            if user.pc_physician == profile_caregiver:
                 answer.is_pc_physician = True
-            elif old_request_prof.filter(Request.kind == "PC_PHYSICIAN").get():
+            elif "PC_PHYSICIAN" in old_request_prof:
                 answer.is_pc_physician = True
                 answer.is_pc_physician_request = True
 
-            if user.visiting_nurse == profile_caregiver.key:
+            if user.visiting_nurse == profile_caregiver:
                 answer.is_visiting_nurse = True
-            elif old_request_prof.filter(Request.kind == "V_NURSE").get():
+            elif "V_NURSE" in old_request_prof:
                 answer.is_visiting_nurse = True
                 answer.is_visiting_nurse_request = True
 
             if profile_user.key.id() in user.caregivers.keys():
                 answer.is_caregiver = True
-            elif old_request_prof.filter(Request.kind == "CAREGIVER").get():
+            elif "CAREGIVER" in old_request_prof:
                 answer.is_caregiver = True
                 answer.is_caregiver_request = True
 
-        user_caregiver = Caregiver.query(ancestor=user.key).get()
-
         if user_caregiver is not None:
-            if profile_user.pc_physician == user_caregiver.key:
+            if profile_user.pc_physician == user_caregiver:
                 answer.is_pc_physician = True
-            elif old_request_user.filter(Request.kind == "PC_PHYSICIAN").get():
+            elif "PC_PHYSICIAN" in old_request_user:
                 answer.is_pc_physician = True
                 answer.is_pc_physician_request = True
 
-            if profile_user.visiting_nurse == user_caregiver.key:
+            if profile_user.visiting_nurse == user_caregiver:
                 answer.is_visiting_nurse = True
-            elif old_request_user.filter(Request.kind == "V_NURSE").get():
+            elif "V_NURSE" in old_request_user:
                 answer.is_visiting_nurse = True
                 answer.is_visiting_nurse_request = True
 
             if user.key.id() in profile_user.caregivers.keys():
                 answer.is_caregiver = True
-            elif old_request_user.filter(Request.kind == "CAREGIVER").get():
+            elif "CAREGIVER" in old_request_user:
                 answer.is_caregiver = True
                 answer.is_caregiver_request = True
 
@@ -2305,11 +3592,7 @@ class RecipexServerApi(remote.Service):
                                                         response=DefaultResponseMessage(code=NOT_FOUND,
                                                                                         message="User not existent.")))
 
-        messages_entities = Message.query(ancestor=user.key)
-        num_messages = 0
-        for message in messages_entities:
-            if not message.hasRead:
-                num_messages += 1
+        num_messages = RecipexServerApi.unread_messages_query(user.key).count()
 
         requests_entities = Request.query(ancestor=user.key)
         num_requests = 0
@@ -2355,121 +3638,128 @@ class RecipexServerApi(remote.Service):
                                                                                     message="User not existent."))
 
         date_time = datetime.utcnow()
+        if request.date_time:
+            try:
+                date_time = RecipexServerApi.parse_date_time(request.date_time)
+            except ValueError:
+                return RecipexServerApi.return_response(code=BAD_REQUEST,
+                                                        message="Bad date_time format.",
+                                                        response=DefaultResponseMessage(code=BAD_REQUEST,
+                                                                                        message="Bad date_time format."))
 
-        if request.kind not in MEASUREMENTS_KIND:
+        new_measurement = Measurement(parent=user.key, date_time=date_time, kind=request.kind, note=request.note,
+                                      calendarId=request.calendarId)
+
+        error = RecipexServerApi.check_measurement(request, new_measurement)
+        if error:
             return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
-                                                    message="Wrong measurement kind.",
+                                                    message=error,
                                                     response=DefaultResponseMessage(code=PRECONDITION_FAILED,
-                                                                                    message="Wrong measurement kind."))
+                                                                                    message=error))
 
-        new_measurement = Measurement(parent=user.key, date_time=date_time, kind=request.kind, note=request.note,
-                                      calendarId=request.calendarId)
+        measurement_key, stored = RecipexServerApi.save_measurements(user.key, [new_measurement],
+                                                                     [request.client_key])[0]
+        if stored:
+            RecipexServerApi.send_alerts(user.key, [new_measurement])
+        else:
+            return RecipexServerApi.return_response(code=CREATED,
+                                                    message="Measurement already added.",
+                                                    response=DefaultResponseMessage(code=CREATED,
+                                                                                    message="Measurement already added.",
+                                                                                    payload=str(measurement_key.id())))
 
-        if request.kind == "BP":
-            if request.systolic is None or request.diastolic is None:
-                return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
-                                                        message="Input parameter(s) missing.",
-                                                        response=DefaultResponseMessage(code=PRECONDITION_FAILED,
-                                                                                        message="Input parameter(s) missing."))
-            if (request.systolic < 0 or request.systolic > 250) or (request.diastolic < 0 or request.diastolic > 250):
-                return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
-                                                        message="Input parameter(s) out of range.",
+        return RecipexServerApi.return_response(code=CREATED,
+                                                message="Measurement added.",
+                                                response=DefaultResponseMessage(code=CREATED,
+                                                                                message="Measurement added.",
+                                                                                payload=str(measurement_key.id())))
+
+    @endpoints.method(ADD_MEASUREMENTS_MESSAGE, MeasurementsResultMessage,
+                      path="recipexServerApi/users/{user_id}/measurements/bulk", http_method="POST",
+                      name="measurement.addMeasurements")
+    def add_measurements(self, request):
+        """Add a batch of Measurements done by some User
+
+        Each Measurement of the batch is validated on its own: the valid ones
+        are all stored with a single batch write, the invalid ones are reported
+        without affecting the others.
+
+        :param request: An ADD_MEASUREMENTS_MESSAGE request message
+        :return: A MeasurementsResultMessage containing a response for each Measurement along with the response
+        """
+        RecipexServerApi.authentication_check()
+
+        user = Key(User, request.user_id).get()
+        if not user:
+            return RecipexServerApi.return_response(code=NOT_FOUND,
+                                                    message="User not existent.",
+                                                    response=MeasurementsResultMessage(
+                                                        response=DefaultResponseMessage(code=NOT_FOUND,
+                                                                                        message="User not existent.")))
+
+        if not request.measurements:
+            return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
+                                                    message="Input parameter missing.",
+                                                    response=MeasurementsResultMessage(
                                                         response=DefaultResponseMessage(code=PRECONDITION_FAILED,
-                                                                                        message="Input parameter(s) out of range."))
-            new_measurement.systolic = request.systolic
-            new_measurement.diastolic = request.diastolic
-        elif request.kind == "HR":
-            if request.bpm is None:
-                return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
-                                                        message="Input parameter missing.",
+                                                                                        message="Input parameter missing.")))
+
+        if len(request.measurements) > MAX_BULK_MEASUREMENTS:
+            return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
+                                                    message="Too many measurements.",
+                                                    response=MeasurementsResultMessage(
                                                         response=DefaultResponseMessage(code=PRECONDITION_FAILED,
-                                                                                        message="Input parameter missing."))
-            if request.bpm < 0 or request.bpm > 400:
-                return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
-                                                        message="Input parameter out of range.",
+                                                                                        message="Too many measurements.")))
+
+        now = datetime.utcnow()
+        results = []
+        new_measurements = []
+        for reading in request.measurements:
+            date_time = now
+            if reading.date_time:
+                try:
+                    date_time = RecipexServerApi.parse_date_time(reading.date_time)
+                except ValueError:
+                    results.append(DefaultResponseMessage(code=BAD_REQUEST, message="Bad date_time format."))
+                    continue
+
+            new_measurement = Measurement(parent=user.key, date_time=date_time, kind=reading.kind, note=reading.note,
+                                          calendarId=reading.calendarId)
+            error = RecipexServerApi.check_measurement(reading, new_measurement)
+            if error:
+                results.append(DefaultResponseMessage(code=PRECONDITION_FAILED, message=error))
+                continue
+
+            results.append(DefaultResponseMessage(code=CREATED, message="Measurement added."))
+            new_measurements.append((len(results) - 1, new_measurement, reading.client_key))
+
+        if not new_measurements:
+            return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
+                                                    message="No measurement added.",
+                                                    response=MeasurementsResultMessage(
+                                                        results=results,
                                                         response=DefaultResponseMessage(code=PRECONDITION_FAILED,
-                                                                                        message="Input parameter out of range."))
-            new_measurement.bpm = request.bpm
-        elif request.kind == "RR":
-            if request.respirations is None:
-                return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
-                                                        message="Input parameter missing.",
-                                                        response=DefaultResponseMessage(code=PRECONDITION_FAILED,
-                                                                                        message="Input parameter missing."))
-            if request.respirations < 0 or request.respirations > 200:
-                return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
-                                                        message="Input parameter out of range.",
-                                                        response=DefaultResponseMessage(code=PRECONDITION_FAILED,
-                                                                                        message="Input parameter out of range."))
-            new_measurement.respirations = request.respirations
-        elif request.kind == "SpO2":
-            if request.spo2 is None:
-                return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
-                                                        message="Input parameter missing.",
-                                                        response=DefaultResponseMessage(code=PRECONDITION_FAILED,
-                                                                                        message="Input parameter missing."))
-            if request.spo2 < 0 or request.spo2 > 100:
-                return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
-                                                        message="Input parameter out of range.",
-                                                        response=DefaultResponseMessage(code=PRECONDITION_FAILED,
-                                                                                        message="Input parameter out of range."))
-            new_measurement.spo2 = request.spo2
-        elif request.kind == "HGT":
-            if request.hgt is None:
-                return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
-                                                        message="Input parameter missing.",
-                                                        response=DefaultResponseMessage(code=PRECONDITION_FAILED,
-                                                                                        message="Input parameter missing."))
-            if request.hgt < 0 or request.hgt > 600:
-                return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
-                                                        message="Input parameter out of range.",
-                                                        response=DefaultResponseMessage(code=PRECONDITION_FAILED,
-                                                                                        message="Input parameter out of range."))
-            new_measurement.hgt = request.hgt
-        elif request.kind == "TMP":
-            if request.degrees is None:
-                return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
-                                                        message="Input parameter missing.",
-                                                        response=DefaultResponseMessage(code=PRECONDITION_FAILED,
-                                                                                        message="Input parameter missing."))
-            if request.degrees < 30 or request.degrees > 45:
-                return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
-                                                        message="Input parameter out of range.",
-                                                        response=DefaultResponseMessage(code=PRECONDITION_FAILED,
-                                                                                        message="Input parameter out of range."))
-            new_measurement.degrees = request.degrees
-        elif request.kind == "PAIN":
-            if request.nrs is None:
-                return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
-                                                        message="Input parameter missing.",
-                                                        response=DefaultResponseMessage(code=PRECONDITION_FAILED,
-                                                                                        message="Input parameter missing."))
-            if request.nrs < 0 or request.hgt > 10:
-                return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
-                                                        message="Input parameter out of range.",
-                                                        response=DefaultResponseMessage(code=PRECONDITION_FAILED,
-                                                                                        message="Input parameter out of range."))
-            new_measurement.nrs = request.nrs
-        else:
-            if request.chl_level is None:
-                return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
-                                                        message="Input parameter missing.",
-                                                        response=DefaultResponseMessage(code=PRECONDITION_FAILED,
-                                                                                        message="Input parameter missing."))
-            if request.chl_level < 0 or request.chl_level > 800:
-                return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
-                                                        message="Input parameter out of range.",
-                                                        response=DefaultResponseMessage(code=PRECONDITION_FAILED,
-                                                                                        message="Input parameter out of range."))
-            new_measurement.chl_level = request.chl_level
-
-        measurement_key = new_measurement.put()
+                                                                                        message="No measurement added.")))
+
+        saved = RecipexServerApi.save_measurements(user.key,
+                                                   [measurement for _, measurement, _ in new_measurements],
+                                                   [client_key for _, _, client_key in new_measurements])
+        stored_measurements = []
+        for (index, measurement, _), (measurement_key, stored) in zip(new_measurements, saved):
+            results[index].payload = str(measurement_key.id())
+            if stored:
+                stored_measurements.append(measurement)
+            else:
+                results[index].message = "Measurement already added."
+        RecipexServerApi.send_alerts(user.key, stored_measurements)
 
         return RecipexServerApi.return_response(code=CREATED,
-                                                message="Measurement added.",
-                                                response=DefaultResponseMessage(code=CREATED,
-                                                                                message="Measurement added.",
-                                                                                payload=str(measurement_key.id())))
+                                                message="Measurements added.",
+                                                response=MeasurementsResultMessage(
+                                                    results=results,
+                                                    response=DefaultResponseMessage(code=CREATED,
+                                                                                    message="Measurements added.",
+                                                                                    payload=str(len(new_measurements)))))
 
     @endpoints.method(UPDATE_MEASUREMENT_MESSAGE, DefaultResponseMessage,
                       path="recipexServerApi/users/{user_id}/measurements/{id}", http_method="PUT", name="measurement.updateMeasurement")
@@ -2519,88 +3809,15 @@ class RecipexServerApi(remote.Service):
             else:
                 measurement.calendarId = None
 
-        if measurement.kind == "BP":
-            if request.systolic is not None:
-                if request.systolic < 0 or request.systolic > 250:
-                    return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
-                                                            message="Input parameter(s) out of range.",
-                                                            response=DefaultResponseMessage(
-                                                                code=PRECONDITION_FAILED,
-                                                                message="Input parameter(s) out of range."))
-                measurement.systolic = request.systolic
-            if request.diastolic is not None:
-                if request.diastolic < 0 or request.diastolic > 250:
-                    return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
-                                                            message="Input parameter out of range.",
-                                                            response=DefaultResponseMessage(
-                                                                code=PRECONDITION_FAILED,
-                                                                message="Input parameter out of range."))
-                measurement.diastolic = request.diastolic
-        elif request.kind == "HR":
-            if request.bpm is not None:
-                if request.bpm < 0 or request.bpm > 400:
-                    return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
-                                                            message="Input parameter out of range.",
-                                                            response=DefaultResponseMessage(
-                                                                code=PRECONDITION_FAILED,
-                                                                message="Input parameter out of range."))
-                measurement.bpm = request.bpm
-        elif request.kind == "RR":
-            if request.respirations is not None:
-                if request.respirations < 0 or request.respirations > 200:
-                    return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
-                                                            message="Input parameter out of range.",
-                                                            response=DefaultResponseMessage(
-                                                                code=PRECONDITION_FAILED,
-                                                                message="Input parameter out of range."))
-                measurement.respirations = request.respirations
-        elif request.kind == "SpO2":
-            if request.spo2 is not None:
-                if request.spo2 < 0 or request.spo2 > 100:
-                    return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
-                                                            message="Input parameter out of range.",
-                                                            response=DefaultResponseMessage(
-                                                                code=PRECONDITION_FAILED,
-                                                                message="Input parameter out of range."))
-                measurement.spo2 = request.spo2
-        elif request.kind == "HGT":
-            if request.hgt is not None:
-                if request.hgt < 0 or request.hgt > 600:
-                    return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
-                                                            message="Input parameter out of range.",
-                                                            response=DefaultResponseMessage(
-                                                                code=PRECONDITION_FAILED,
-                                                                message="Input parameter out of range."))
-                measurement.hgt = request.hgt
-        elif request.kind == "TMP":
-            if request.degrees is not None:
-                if request.degrees < 30 or request.degrees > 45:
-                    return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
-                                                            message="Input parameter out of range.",
-                                                            response=DefaultResponseMessage(
-                                                                code=PRECONDITION_FAILED,
-                                                                message="Input parameter out of range."))
-                measurement.degrees = request.degrees
-        elif request.kind == "PAIN":
-            if request.nrs is not None:
-                if request.nrs < 0 or request.nrs > 10:
-                    return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
-                                                            message="Input parameter out of range.",
-                                                            response=DefaultResponseMessage(
-                                                                code=PRECONDITION_FAILED,
-                                                                message="Input parameter out of range."))
-                measurement.nrs = request.nrs
-        else:
-            if request.chl_level is not None:
-                if request.chl_level < 0 or request.chl_level > 800:
-                    return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
-                                                            message="Input parameter out of range.",
-                                                            response=DefaultResponseMessage(
-                                                                code=PRECONDITION_FAILED,
-                                                                message="Input parameter out of range."))
-                measurement.chl_level = request.chl_level
+        error = RecipexServerApi.check_measurement(request, measurement, partial=True)
+        if error:
+            return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
+                                                    message=error,
+                                                    response=DefaultResponseMessage(code=PRECONDITION_FAILED,
+                                                                                    message=error))
 
-        measurement.put()
+        previous = RecipexServerApi.put_measurement(measurement)
+        RecipexServerApi.send_alerts(user_key, [measurement], previous=[previous] if previous else [])
         return RecipexServerApi.return_response(code=OK,
                                                 message="Measurement updated.",
                                                 response=DefaultResponseMessage(code=OK,
@@ -2680,7 +3897,7 @@ class RecipexServerApi(remote.Service):
                                                     response=DefaultResponseMessage(code="401 Unauthorized",
                                                                                     message="User unauthorized."))
 
-        measurement.key.delete()
+        RecipexServerApi.delete_measurement_entity(measurement)
         return RecipexServerApi.return_response(code=OK,
                                                 message="Measurement deleted.",
                                                 response=DefaultResponseMessage(code=OK,
@@ -2724,21 +3941,164 @@ class RecipexServerApi(remote.Service):
                                                                                             message="Measurement not existent.")))
 
         message = Message(parent=receiver.key, sender=sender.key, receiver=receiver.key, message=request.message,
-                          hasRead=False, measurement=measurement_key)
+                          hasRead=False, measurement=measurement_key, created=datetime.utcnow())
 
         message.put()
+        RecipexServerApi.log_changes("MESSAGE", [message.key])
         return RecipexServerApi.return_response(code=CREATED,
                                                 message="Message sent.",
                                                 response=UserMeasurementsMessage(
                                                     response=DefaultResponseMessage(code=CREATED,
                                                                                     message="Message sent.")))
 
+    @endpoints.method(BROADCAST_SEND_MESSAGE, BroadcastInfoMessage,
+                      path="recipexServerApi/users/{user_id}/broadcasts", http_method="POST",
+                      name="message.sendBroadcast")
+    def send_broadcast(self, request):
+        """Send a Message to all the patients of some Caregiver
+
+        The Messages are written by a deferred task, so the response only tells
+        how many patients will receive it. Retrying the request with the same
+        client_key doesn't send the Message again.
+
+        :param request: A BROADCAST_SEND_MESSAGE request message
+        :return: A BroadcastInfoMessage containing the progress of the Broadcast along with the response
+        """
+        RecipexServerApi.authentication_check()
+
+        user = Key(User, request.user_id).get()
+        if not user:
+            return RecipexServerApi.return_response(code=NOT_FOUND,
+                                                    message="User not existent.",
+                                                    response=BroadcastInfoMessage(
+                                                        response=DefaultResponseMessage(code=NOT_FOUND,
+                                                                                        message="User not existent.")))
+
+        caregiver = Caregiver.query(ancestor=user.key).get()
+        if not caregiver:
+            return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
+                                                    message="User not a caregiver.",
+                                                    response=BroadcastInfoMessage(
+                                                        response=DefaultResponseMessage(code=PRECONDITION_FAILED,
+                                                                                        message="User not a caregiver.")))
+
+        broadcast, created = RecipexServerApi.start_broadcast(
+            Broadcast(parent=user.key, id=request.client_key, message=request.message,
+                      receivers=list(caregiver.patients.values())))
+        info = RecipexServerApi.broadcast_info(broadcast)
+        if created:
+            info.response = DefaultResponseMessage(code=CREATED, message="Broadcast sent.")
+        else:
+            info.response = DefaultResponseMessage(code=CREATED, message="Broadcast already sent.")
+        return RecipexServerApi.return_response(code=CREATED,
+                                                message=info.response.message,
+                                                response=info)
+
+    @endpoints.method(BROADCAST_ID_MESSAGE, BroadcastInfoMessage,
+                      path="recipexServerApi/users/{user_id}/broadcasts/{id}", http_method="GET",
+                      name="message.getBroadcast")
+    def get_broadcast(self, request):
+        """Retrieve the progress of a Broadcast
+
+        :param request: A BROADCAST_ID_MESSAGE request message
+        :return: A BroadcastInfoMessage containing the progress of the Broadcast along with the response
+        """
+        RecipexServerApi.authentication_check()
+
+        broadcast = Key(User, request.user_id, Broadcast, request.id).get()
+        if not broadcast:
+            return RecipexServerApi.return_response(code=NOT_FOUND,
+                                                    message="Broadcast not existent.",
+                                                    response=BroadcastInfoMessage(
+                                                        response=DefaultResponseMessage(code=NOT_FOUND,
+                                                                                        message="Broadcast not existent.")))
+
+        info = RecipexServerApi.broadcast_info(broadcast)
+        info.response = DefaultResponseMessage(code=OK, message="Broadcast info retrieved.")
+        return RecipexServerApi.return_response(code=OK,
+                                                message="Broadcast info retrieved.",
+                                                response=info)
+
+    @endpoints.method(THREAD_MESSAGE, UserMessagesMessage,
+                      path="recipexServerApi/users/{user_id}/threads/{other_id}", http_method="GET",
+                      name="message.getThread")
+    def get_thread(self, request):
+        """Retrieve the Messages exchanged between two Users, a page at a time
+
+        Each page holds the most recent Messages not returned yet, sorted from the oldest
+        to the newest. The Messages sent in each direction are read by an indexed query
+        (on the receiver's entity group, by sender and Day and Time) and the two queries are
+        merged here: the returned cursor keeps the position reached by each of them.
+
+        :param request: A THREAD_MESSAGE request message
+        :return: A UserMessagesMessage containing a page of the Messages along with the response
+        """
+        RecipexServerApi.authentication_check()
+
+        if request.user_id == request.other_id:
+            return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
+                                                    message="Users not different.",
+                                                    response=UserMessagesMessage(
+                                                        response=DefaultResponseMessage(code=PRECONDITION_FAILED,
+                                                                                        message="Users not different.")))
+
+        user_key = Key(User, request.user_id)
+        other_key = Key(User, request.other_id)
+        user, other = ndb.get_multi([user_key, other_key])
+        if not user or not other:
+            return RecipexServerApi.return_response(code=NOT_FOUND,
+                                                    message="User not existent.",
+                                                    response=UserMessagesMessage(
+                                                        response=DefaultResponseMessage(code=NOT_FOUND,
+                                                                                        message="User not existent.")))
+
+        try:
+            cursors = request.cursor.split("|") if request.cursor else ["", ""]
+            if len(cursors) != 2:
+                raise datastore_errors.BadValueError("Wrong number of cursors.")
+            start_cursors = [Cursor(urlsafe=cursor) if cursor else None for cursor in cursors]
+        except datastore_errors.BadValueError:
+            return RecipexServerApi.return_response(code=BAD_REQUEST,
+                                                    message="Bad cursor.",
+                                                    response=UserMessagesMessage(
+                                                        response=DefaultResponseMessage(code=BAD_REQUEST,
+                                                                                        message="Bad cursor.")))
+
+        page_size = min(request.fetch or MESSAGES_PAGE_SIZE, MAX_MESSAGES_PAGE_SIZE)
+        iterators = []
+        for (receiver_key, sender_key), start_cursor in zip([(user_key, other_key), (other_key, user_key)],
+                                                            start_cursors):
+            query = Message.query(ancestor=receiver_key)\
+                           .filter(Message.sender == sender_key)\
+                           .order(-Message.created)
+            iterators.append(query.iter(start_cursor=start_cursor, produce_cursors=True,
+                                        limit=page_size + 1, batch_size=page_size + 1))
+        ndb.Future.wait_all([iterator.has_next_async() for iterator in iterators])
+
+        heads = [iterator.next() if iterator.has_next() else None for iterator in iterators]
+        thread = []
+        while len(thread) < page_size and (heads[0] or heads[1]):
+            side = 0 if heads[1] is None or (heads[0] and heads[0].created >= heads[1].created) else 1
+            thread.append(heads[side])
+            cursors[side] = iterators[side].cursor_after().urlsafe()
+            heads[side] = iterators[side].next() if iterators[side].has_next() else None
+        thread.reverse()
+
+        return RecipexServerApi.return_response(code=OK,
+                                                message="Thread retrieved.",
+                                                response=UserMessagesMessage(
+                                                    user_messages=RecipexServerApi.messages_info(
+                                                        thread, with_measurement=request.with_measurement),
+                                                    next_cursor="|".join(cursors) if heads[0] or heads[1] else None,
+                                                    response=DefaultResponseMessage(code=OK,
+                                                                                    message="Thread retrieved.")))
+
     @endpoints.method(MESSAGE_ID_MESSAGE, MessageInfoMessage,
                       path="recipexServerApi/users/{user_id}/messages/{id}", http_method="GET", name="message.getMessage")
     def get_message(self, request):
         """Retrieve all the informations of some Message
 
-        :param request: A MESSAGE_ID_MESSAGE request message
+        :param request: A MESSAGE_ID_MESSAGE request message (with_measurement is optional)
         :return: A MessageInfoMessage containing all the Message's informations along with the response
         """
         RecipexServerApi.authentication_check()
@@ -2766,16 +4126,13 @@ class RecipexServerApi(remote.Service):
                                                         response=DefaultResponseMessage(code=PRECONDITION_FAILED,
                                                                                         message="User not the receiver.")))
 
-        message.hasRead = True
-        message.put()
+        if not message.hasRead:
+            message.hasRead = True
+            message.put()
+            RecipexServerApi.log_changes("MESSAGE", [message.key])
 
-        sender = message.sender.get()
-        pic = None
-        if sender:
-            pic = sender.pic
-        msg_msg = MessageInfoMessage(sender=message.sender.id(), receiver=message.receiver.id(), message=message.message,
-                                     hasRead=message.hasRead, measurement=message.measurement.id(), sender_pic=pic,
-                                     response=DefaultResponseMessage(code=OK, message="Message info retrieved."))
+        msg_msg = RecipexServerApi.messages_info([message], with_measurement=request.with_measurement)[0]
+        msg_msg.response = DefaultResponseMessage(code=OK, message="Message info retrieved.")
 
         return RecipexServerApi.return_response(code=OK,
                                                 message="Message info retrieved.",
@@ -2811,8 +4168,10 @@ class RecipexServerApi(remote.Service):
                                                     response=DefaultResponseMessage(code=PRECONDITION_FAILED,
                                                                                     message="User not the receiver."))
 
-        message.hasRead = True
-        message.put()
+        if not message.hasRead:
+            message.hasRead = True
+            message.put()
+            RecipexServerApi.log_changes("MESSAGE", [message.key])
 
         return RecipexServerApi.return_response(code=OK,
                                                 message="Message read.",
@@ -2850,6 +4209,7 @@ class RecipexServerApi(remote.Service):
                                                                                     message="User not the receiver."))
 
         message.key.delete()
+        RecipexServerApi.log_changes("MESSAGE", [message.key], deleted=True)
 
         return RecipexServerApi.return_response(code=OK,
                                                 message="Message deleted.",
@@ -2866,38 +4226,29 @@ class RecipexServerApi(remote.Service):
         """
         RecipexServerApi.authentication_check()
 
-        sender = Key(User, request.sender).get()
+        if request.kind not in REQUEST_KIND:
+            return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
+                                                    message="Kind not existent.",
+                                                    response=DefaultResponseMessage(code=PRECONDITION_FAILED,
+                                                                                    message="Kind not existent."))
+
+        sender_key = Key(User, request.sender)
+        receiver_key = Key(User, request.receiver)
+        lock_key = RecipexServerApi.request_lock_key(request.kind, sender_key, receiver_key)
+        sender, receiver, lock = ndb.get_multi([sender_key, receiver_key, lock_key])
         if not sender:
             return RecipexServerApi.return_response(code=NOT_FOUND,
                                                     message="Sender not existent.",
                                                     response=DefaultResponseMessage(code=NOT_FOUND,
                                                                                     message="Sender not existent."))
 
-        receiver = Key(User, request.receiver).get()
         if not receiver:
             return RecipexServerApi.return_response(code=NOT_FOUND,
                                                     message="Receiver not existent.",
                                                     response=DefaultResponseMessage(code=NOT_FOUND,
                                                                                     message="Receiver not existent."))
 
-        if request.kind not in REQUEST_KIND:
-            return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
-                                                    message="Kind not existent.",
-                                                    response=DefaultResponseMessage(code=PRECONDITION_FAILED,
-                                                                                    message="Kind not existent."))
-
-        old_request = Request.query(ancestor=receiver.key).filter(ndb.AND(Request.sender == sender.key,
-                                                                          Request.kind == request.kind)).get()
-        if old_request:
-            return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
-                                                    message="Request already existent.",
-                                                    response=DefaultResponseMessage(code=PRECONDITION_FAILED,
-                                                                                    message="Request already existent."))
-
-        old_request = Request.query(ancestor=sender.key).filter(ndb.AND(Request.sender == receiver.key,
-                                                                        Request.kind == request.kind)).get()
-
-        if old_request:
+        if lock and lock.request.get():
             return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
                                                     message="Request already existent.",
                                                     response=DefaultResponseMessage(code=PRECONDITION_FAILED,
@@ -2915,8 +4266,8 @@ class RecipexServerApi(remote.Service):
             if request.role == "PATIENT":
                 patient = sender
                 caregiver_user = receiver
-                caregiver = Caregiver.query(ancestor=receiver.key).get()
-                if not caregiver:
+                caregiver_key = Caregiver.query(ancestor=receiver.key).get(keys_only=True)
+                if not caregiver_key:
                     return RecipexServerApi.return_response(code="412 Not Found",
                                                             message="Receiver not a caregiver.",
                                                             response=DefaultResponseMessage(code="412 Not Found",
@@ -2924,8 +4275,8 @@ class RecipexServerApi(remote.Service):
             else:
                 patient = receiver
                 caregiver_user = sender
-                caregiver = Caregiver.query(ancestor=sender.key).get()
-                if not caregiver:
+                caregiver_key = Caregiver.query(ancestor=sender.key).get(keys_only=True)
+                if not caregiver_key:
                     return RecipexServerApi.return_response(code="412 Not Found",
                                                             message="Sender not a caregiver.",
                                                             response=DefaultResponseMessage(code="412 Not Found",
@@ -2939,20 +4290,19 @@ class RecipexServerApi(remote.Service):
                                                                 code=PRECONDITION_FAILED,
                                                                 message="Already a caregiver."))
             elif request.kind == "PC_PHYSICIAN":
-                if patient.pc_physician == caregiver.key:
+                if patient.pc_physician == caregiver_key:
                     return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
                                                             message="Already the pc_physician.",
                                                             response=DefaultResponseMessage(
                                                                 code=PRECONDITION_FAILED,
                                                                 message="Already the pc_physician."))
             else:
-                if patient.visiting_nurse == caregiver.key:
+                if patient.visiting_nurse == caregiver_key:
                     return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
                                                             message="Already the visiting Nurse.",
                                                             response=DefaultResponseMessage(
                                                                 code=PRECONDITION_FAILED,
                                                                 message="Already the visiting Nurse."))
-            caregiver_key = caregiver.key
         else:
             if receiver.relatives and sender.key.id() in receiver.relatives.keys():
                 return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
@@ -2963,9 +4313,16 @@ class RecipexServerApi(remote.Service):
 
         new_request = Request(parent=receiver.key, sender=sender.key, receiver=receiver.key,
                               kind=request.kind, message=request.message, role=request.role,
-                              isPending=True, caregiver=caregiver_key, calendarId=request.calendarId)
+                              isPending=True, caregiver=caregiver_key, calendarId=request.calendarId,
+                              created=datetime.utcnow())
 
-        new_request.put()
+        # Two concurrent Requests can both pass the check above: only one of them gets the lock
+        if not RecipexServerApi.put_request(new_request, lock_key):
+            return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
+                                                    message="Request already existent.",
+                                                    response=DefaultResponseMessage(code=PRECONDITION_FAILED,
+                                                                                    message="Request already existent."))
+        RecipexServerApi.log_changes("REQUEST", [new_request.key], also_notify=[new_request.sender])
 
         return RecipexServerApi.return_response(code=CREATED,
                                                 message="Request sent.",
@@ -3006,8 +4363,10 @@ class RecipexServerApi(remote.Service):
                                                         response=DefaultResponseMessage(code=PRECONDITION_FAILED,
                                                                                         message="User not the receiver.")))
 
-        usr_request.isPending = False
-        usr_request.put()
+        if usr_request.isPending:
+            usr_request.isPending = False
+            usr_request.put()
+            RecipexServerApi.log_changes("REQUEST", [usr_request.key], also_notify=[usr_request.sender])
 
         sender = usr_request.sender.get()
         pic = None
@@ -3110,7 +4469,8 @@ class RecipexServerApi(remote.Service):
                 caregiver.put()
 
         calendarid = usr_request.calendarId
-        usr_request.key.delete()
+        RecipexServerApi.delete_request_entity(usr_request)
+        RecipexServerApi.log_changes("REQUEST", [usr_request.key], deleted=True, also_notify=[usr_request.sender])
 
         return RecipexServerApi.return_response(code=OK,
                                                 message="Answer received.",
@@ -3161,7 +4521,8 @@ class RecipexServerApi(remote.Service):
                                                     response=DefaultResponseMessage(code=PRECONDITION_FAILED,
                                                                                     message="User not the receiver."))
 
-        usr_request.key.delete()
+        RecipexServerApi.delete_request_entity(usr_request)
+        RecipexServerApi.log_changes("REQUEST", [usr_request.key], deleted=True, also_notify=[usr_request.sender])
 
         return RecipexServerApi.return_response(code=OK,
                                                 message="Request deleted.",
@@ -3322,6 +4683,7 @@ class RecipexServerApi(remote.Service):
             prescription.seen = False
 
         prescription_key = prescription.put()
+        RecipexServerApi.log_changes("PRESCRIPTION", [prescription_key])
         return RecipexServerApi.return_response(code=CREATED,
                                                 message="Prescription added.",
                                                 response=DefaultResponseMessage(code=CREATED,
@@ -3365,6 +4727,7 @@ class RecipexServerApi(remote.Service):
         if not prescription.seen:
             prescription.seen = True
             prescription.put()
+            RecipexServerApi.log_changes("PRESCRIPTION", [prescription.key])
 
         if prescription.caregiver is not None:
             user_caregiver = prescription.caregiver.parent().get()
@@ -3457,6 +4820,7 @@ class RecipexServerApi(remote.Service):
                 prescription.calendarIds = request.calendarIds
 
         prescription.put()
+        RecipexServerApi.log_changes("PRESCRIPTION", [prescription.key])
         return RecipexServerApi.return_response(code=OK,
                                                 message="Prescription updated.",
                                                 response=DefaultResponseMessage(code=OK,
@@ -3489,37 +4853,1672 @@ class RecipexServerApi(remote.Service):
                                                                                         message="Prescription not existent.")))
 
         prescription.key.delete()
+        RecipexServerApi.log_changes("PRESCRIPTION", [prescription.key], deleted=True)
         return RecipexServerApi.return_response(code=OK,
                                                 message="Prescription deleted.",
                                                 response=DefaultResponseMessage(code=OK,
                                                                                 message="Prescription deleted."))
 
+    @endpoints.method(ADD_ALERT_RULE_MESSAGE, DefaultResponseMessage,
+                      path="recipexServerApi/users/{user_id}/alert-rules", http_method="POST",
+                      name="alertRule.addAlertRule")
+    def add_alert_rule(self, request):
+        """Add a new AlertRule on the Measurements of some User
+
+        Only the Caregivers of the User can set AlertRules on his Measurements.
+
+        :param request: An ADD_ALERT_RULE_MESSAGE request message
+        :return: A DefaultResponseMessage containing the Datastore id of the AlertRule along with the response
+        """
+        RecipexServerApi.authentication_check()
+
+        user_key = Key(User, request.user_id)
+        caregiver_key = Key(User, request.caregiver)
+        user, caregiver_user = ndb.get_multi([user_key, caregiver_key])
+        if not user:
+            return RecipexServerApi.return_response(code=NOT_FOUND,
+                                                    message="User not existent.",
+                                                    response=DefaultResponseMessage(code=NOT_FOUND,
+                                                                                    message="User not existent."))
+
+        if not caregiver_user:
+            return RecipexServerApi.return_response(code=NOT_FOUND,
+                                                    message="Caregiver not existent.",
+                                                    response=DefaultResponseMessage(code=NOT_FOUND,
+                                                                                    message="Caregiver not existent."))
+
+        caregiver = Caregiver.query(ancestor=caregiver_key).get()
+        if not caregiver:
+            return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
+                                                    message="Caregiver not a caregiver.",
+                                                    response=DefaultResponseMessage(code=PRECONDITION_FAILED,
+                                                                                    message="Caregiver not a caregiver."))
+
+        if user_key.id() not in caregiver.patients.keys():
+            return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
+                                                    message="User not a patient.",
+                                                    response=DefaultResponseMessage(code=PRECONDITION_FAILED,
+                                                                                    message="User not a patient."))
+
+        if request.kind not in MEASUREMENTS_KIND:
+            return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
+                                                    message="Measurement kind not existent.",
+                                                    response=DefaultResponseMessage(code=PRECONDITION_FAILED,
+                                                                                    message="Measurement kind not existent."))
+
+        if request.value not in [name for name, _, _ in MEASUREMENTS_VALUES[request.kind]] or \
+           request.operator not in ALERT_OPERATORS:
+            return RecipexServerApi.return_response(code=PRECONDITION_FAILED,
+                                                    message="Wrong alert rule.",
+                                                    response=DefaultResponseMessage(code=PRECONDITION_FAILED,
+                                                                                    message="Wrong alert rule."))
+
+        rule = AlertRule(parent=user_key, caregiver=caregiver_key, kind=request.kind, value=request.value,
+                         operator=request.operator, threshold=request.threshold)
+        rule_key = rule.put()
+        memcache.delete(RecipexServerApi.alert_rules_cache_key(user_key))
+        return RecipexServerApi.return_response(code=CREATED,
+                                                message="Alert rule added.",
+                                                response=DefaultResponseMessage(code=CREATED,
+                                                                                message="Alert rule added.",
+                                                                                payload=str(rule_key.id())))
+
+    @endpoints.method(USER_ID_MESSAGE, UserAlertRulesMessage,
+                      path="recipexServerApi/users/{id}/alert-rules", http_method="GET",
+                      name="alertRule.getAlertRules")
+    def get_alert_rules_list(self, request):
+        """Retrieve all the AlertRules on the Measurements of some User
+
+        :param request: A USER_ID_MESSAGE request message
+        :return: A UserAlertRulesMessage containing the list of the User's AlertRules along with the response
+        """
+        RecipexServerApi.authentication_check()
+
+        user = Key(User, request.id).get()
+        if not user:
+            return RecipexServerApi.return_response(code=NOT_FOUND,
+                                                    message="User not existent.",
+                                                    response=UserAlertRulesMessage(
+                                                        response=DefaultResponseMessage(code=NOT_FOUND,
+                                                                                        message="User not existent.")))
+
+        rules = [AlertRuleMessage(id=rule.key.id(), caregiver=rule.caregiver.id(), kind=rule.kind, value=rule.value,
+                                  operator=rule.operator, threshold=rule.threshold)
+                 for rule in AlertRule.query(ancestor=user.key)]
+
+        return RecipexServerApi.return_response(code=OK,
+                                                message="Alert rules retrieved.",
+                                                response=UserAlertRulesMessage(
+                                                    rules=rules,
+                                                    response=DefaultResponseMessage(code=OK,
+                                                                                    message="Alert rules retrieved.")))
+
+    @endpoints.method(ALERT_RULE_ID_MESSAGE, DefaultResponseMessage,
+                      path="recipexServerApi/users/{user_id}/alert-rules/{id}", http_method="DELETE",
+                      name="alertRule.deleteAlertRule")
+    def delete_alert_rule(self, request):
+        """Delete an existing AlertRule
+
+        :param request: An ALERT_RULE_ID_MESSAGE request message
+        :return: A DefaultResponseMessage containing the response
+        """
+        RecipexServerApi.authentication_check()
+
+        user_key = Key(User, request.user_id)
+        rule = Key(AlertRule, request.id, parent=user_key).get()
+        if not rule:
+            return RecipexServerApi.return_response(code=NOT_FOUND,
+                                                    message="Alert rule not existent.",
+                                                    response=DefaultResponseMessage(code=NOT_FOUND,
+                                                                                    message="Alert rule not existent."))
+
+        rule.key.delete()
+        memcache.delete(RecipexServerApi.alert_rules_cache_key(user_key))
+        return RecipexServerApi.return_response(code=OK,
+                                                message="Alert rule deleted.",
+                                                response=DefaultResponseMessage(code=OK,
+                                                                                message="Alert rule deleted."))
+
     @classmethod
-    def authentication_check(cls):
-        """To check User Credentials
+    def check_measurement(cls, reading, measurement, partial=False):
+        """To validate a Measurement's values
 
-        This method is used at the beginning of each RPC method offered by
-        the backend to check the user credentials against OAuth 2.0
-        authentication requested by the web service to interact with it.
+        This method checks the values of a reading (i.e. an AddMeasurementMessage) against
+        the spec of its kind (see MEASUREMENTS_SPECS) and copies them into the given Measurement entity.
+        Nothing is copied if the reading is not valid.
+
+        :param reading: The message containing the values of the Measurement
+        :param measurement: The Measurement entity to be filled in
+        :param partial: True if the mandatory values may be missing (i.e. to update a Measurement)
+        :return: None if the reading is valid, the error message otherwise
+        """
+        spec = MEASUREMENTS_SPECS.get(reading.kind)
+        if spec is None:
+            return "Wrong measurement kind."
+
+        values, missing, out_of_range = spec
+        checked = []
+        for name, minimum, maximum in values:
+            value = getattr(reading, name)
+            if value is None:
+                if partial:
+                    continue
+                return missing
+            checked.append((name, value, minimum, maximum))
+
+        for name, value, minimum, maximum in checked:
+            if value < minimum or value > maximum:
+                return out_of_range
+
+        for name, value, _, _ in checked:
+            setattr(measurement, name, value)
+
+        return None
+
+    @classmethod
+    @ndb.transactional
+    def save_measurements(cls, user_key, new_measurements, client_keys):
+        """To store new Measurements of some User
+
+        Measurements sent along with a client side key are stored only the first time
+        the key is seen (within MEASUREMENT_DEDUPE_HOURS), so that the retries of the
+        mobile application on flaky networks don't duplicate them.
+        Everything is written within a single transaction on the User's entity group.
+
+        :param user_key: Key of the User entity the Measurements belong to
+        :param new_measurements: List of Measurement entities to be stored
+        :param client_keys: List of client side keys (or None) of the Measurements
+        :return: A list of (Measurement key, True if the Measurement has been stored now) tuples
+        """
+        expiry = datetime.utcnow() - timedelta(hours=MEASUREMENT_DEDUPE_HOURS)
+        dedupe_keys = [Key(MeasurementDedupe, client_key, parent=user_key)
+                       for client_key in set(client_keys) if client_key]
+
+        known_keys = {}
+        for dedupe in ndb.get_multi(dedupe_keys):
+            if dedupe and dedupe.created > expiry:
+                known_keys[dedupe.key.id()] = dedupe.measurement
+
+        to_store = []
+        seen = set(known_keys.keys())
+        for measurement, client_key in zip(new_measurements, client_keys):
+            if client_key:
+                if client_key in seen:
+                    continue
+                seen.add(client_key)
+            to_store.append((measurement, client_key))
+
+        stored_keys = ndb.put_multi([measurement for measurement, _ in to_store])
+        now = datetime.utcnow()
+        dedupes = []
+        for (measurement, client_key), measurement_key in zip(to_store, stored_keys):
+            if client_key:
+                known_keys[client_key] = measurement_key
+                dedupes.append(MeasurementDedupe(parent=user_key, id=client_key,
+                                                 measurement=measurement_key, created=now))
+        ndb.put_multi(dedupes)
+        cls.refresh_latest_measurements(user_key, stored=[measurement for measurement, _ in to_store])
+        cls.refresh_measurement_stats(user_key, stored=[measurement for measurement, _ in to_store])
+        if COLUMNAR_MEASUREMENTS:
+            cls.refresh_measurement_months(user_key, stored=[measurement for measurement, _ in to_store])
+
+        stored = set(stored_keys)
+        result = []
+        for measurement, client_key in zip(new_measurements, client_keys):
+            measurement_key = known_keys[client_key] if client_key else measurement.key
+            result.append((measurement_key, measurement.key in stored))
+        return result
+
+    @classmethod
+    @ndb.transactional
+    def put_measurement(cls, measurement):
+        """To store the changes of an existing Measurement
+
+        :param measurement: The updated Measurement entity
+        :return: The previous version of the Measurement entity (None if it didn't exist)
+        """
+        previous = measurement.key.get(use_cache=False, use_memcache=False)
+        measurement_key = measurement.put()
+        cls.refresh_latest_measurements(measurement_key.parent(), stored=[measurement])
+        cls.refresh_measurement_stats(measurement_key.parent(), stored=[measurement],
+                                      removed=[previous] if previous else [])
+        if COLUMNAR_MEASUREMENTS:
+            cls.refresh_measurement_months(measurement_key.parent(), stored=[measurement])
+        return previous
+
+    @classmethod
+    @ndb.transactional
+    def delete_measurement_entity(cls, measurement):
+        """To delete an existing Measurement
 
+        :param measurement: The Measurement entity to be deleted
         :return: Nothing (void)
         """
-        current_user = endpoints.get_current_user()
-        if not current_user:
-            raise endpoints.UnauthorizedException('Invalid token.')
+        measurement.key.delete()
+        cls.refresh_latest_measurements(measurement.key.parent(), deleted=[measurement])
+        cls.refresh_measurement_stats(measurement.key.parent(), removed=[measurement])
+        if COLUMNAR_MEASUREMENTS:
+            cls.refresh_measurement_months(measurement.key.parent(), deleted=[measurement])
 
     @classmethod
-    def return_response(cls, code, message, response):
-        """ To return the response logging the operation's results
+    @ndb.transactional
+    def start_broadcast(cls, broadcast):
+        """To store a new Broadcast and enqueue the task sending its Messages
 
-        :param code: The HTTP code resulting by the RPC invocation
-        :param message: The message to be displayed
-        :param response: The overall response to be sent back to the User
-        :return: The response given as input
+        :param broadcast: The new Broadcast entity
+        :return: A (Broadcast entity, True if it has been stored now) tuple
         """
-        logging.info("CODE: %s " % code)
-        logging.info("MESSAGE: %s " % message)
-        return response
+        existing = broadcast.key.get()
+        if existing:
+            return existing, False
+        broadcast.completed = not broadcast.receivers
+        broadcast.put()
+        if not broadcast.completed:
+            deferred.defer(fan_out_broadcast, broadcast.key, _transactional=True)
+        return broadcast, True
 
-"""Web Service instance initialization"""
-APPLICATION = endpoints.api_server([RecipexServerApi])
+    @classmethod
+    def broadcast_info(cls, broadcast):
+        """To build the BroadcastInfoMessage of a Broadcast
+
+        :param broadcast: A Broadcast entity
+        :return: The BroadcastInfoMessage (without response)
+        """
+        return BroadcastInfoMessage(id=broadcast.key.id(), message=broadcast.message, total=len(broadcast.receivers),
+                                    sent=broadcast.sent, completed=broadcast.completed)
+
+    @classmethod
+    def log_changes(cls, kind, entity_keys, deleted=False, also_notify=None):
+        """To append the changes of some entities to the change logs of their Users
+
+        Each change is logged into the change log of the User the entity belongs to (i.e. its parent)
+        and, if given, into the one of another User (e.g. the sender of a Request).
+
+        :param kind: Kind of the changed entities (see CHANGE_KIND)
+        :param entity_keys: List of keys of the changed entities
+        :param deleted: True if the entities have been deleted
+        :param also_notify: List of keys (or None) of the further User to be notified of each change,
+                            in the same order of entity_keys
+        :return: Nothing (void)
+        """
+        ndb.put_multi(cls.change_log_entries(kind, entity_keys, deleted, also_notify))
+
+    @classmethod
+    def change_log_entries(cls, kind, entity_keys, deleted=False, also_notify=None):
+        """To build the ChangeLogEntry entities of the changes of some entities (see log_changes)
+
+        :param kind: Kind of the changed entities (see CHANGE_KIND)
+        :param entity_keys: List of keys of the changed entities
+        :param deleted: True if the entities have been deleted
+        :param also_notify: List of keys (or None) of the further User to be notified of each change
+        :return: A list of (not stored) ChangeLogEntry entities
+        """
+        entries = []
+        for entity_key, user_key in zip(entity_keys, also_notify or [None] * len(entity_keys)):
+            for parent in set([entity_key.parent(), user_key]) - set([None]):
+                entries.append(ChangeLogEntry(parent=parent, kind=kind, entity=entity_key, deleted=deleted))
+        return entries
+
+    @classmethod
+    def change_token(cls, date_time, until=None, cursor=None):
+        """To build the synchronization token of a Day and Time
+
+        The token of a page of changes but the last one also holds the upper bound
+        and the cursor of its query, so that the following page goes on exactly where it stopped.
+
+        :param date_time: A (naive) UTC datetime
+        :param until: The (naive) UTC datetime the changes of the synchronization are read until
+        :param cursor: The query cursor of the next page of changes
+        :return: The token, i.e. the microseconds since the epoch as a string (followed by the
+                 microseconds of until and the urlsafe cursor, separated by colons)
+        """
+        def microseconds(value):
+            delta = value - datetime(1970, 1, 1)
+            return str((delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds)
+
+        if cursor is None:
+            return microseconds(date_time)
+        return "%s:%s:%s" % (microseconds(date_time), microseconds(until), cursor.urlsafe())
+
+    @classmethod
+    def parse_change_token(cls, token):
+        """To parse a synchronization token
+
+        :param token: A token built by change_token
+        :return: A (since, until, cursor) tuple: until and cursor are None unless the token is of a following page
+        :raise ValueError: If the token is not well formatted
+        :raise BadValueError: If the cursor is not well formatted
+        """
+        parts = token.split(":")
+        if len(parts) not in (1, 3):
+            raise ValueError("Bad token.")
+        since = datetime(1970, 1, 1) + timedelta(microseconds=int(parts[0]))
+        if len(parts) == 1:
+            return since, None, None
+        return since, datetime(1970, 1, 1) + timedelta(microseconds=int(parts[1])), Cursor(urlsafe=parts[2])
+
+    @classmethod
+    def changes_info(cls, user, entries):
+        """To build the ChangeMessage of some change log entries of a User
+
+        The changed entities still existing are fetched with a single batch get, then
+        their informations are built by messages_info, requests_info and prescriptions_info.
+
+        :param user: The User entity
+        :param entries: List of ChangeLogEntry entities of the User
+        :return: A list of ChangeMessage, in the same order of the entries
+        """
+        entity_keys = list(set(entry.entity for entry in entries if not entry.deleted))
+        entities = dict(zip(entity_keys, ndb.get_multi(entity_keys)))
+        by_kind = {}
+        for entity in entities.values():
+            if entity:
+                by_kind.setdefault(entity.key.kind(), []).append(entity)
+
+        infos = {}
+        builders = [("Message", cls.messages_info), ("Request", cls.requests_info),
+                    ("Prescription", lambda prescriptions: cls.prescriptions_info(user, prescriptions))]
+        for kind, builder in builders:
+            kind_entities = by_kind.get(kind, [])
+            infos.update(zip([entity.key for entity in kind_entities], builder(kind_entities)))
+
+        changes = []
+        for entry in entries:
+            info = infos.get(entry.entity)
+            change = ChangeMessage(kind=entry.kind, id=entry.entity.id(), user_id=entry.entity.parent().id(),
+                                   deleted=entry.deleted or info is None,
+                                   date_time=cls.format_date_time(entry.created))
+            if entry.kind == "MESSAGE":
+                change.message_info = info
+            elif entry.kind == "REQUEST":
+                change.request_info = info
+            else:
+                change.prescription_info = info
+            changes.append(change)
+        return changes
+
+    @classmethod
+    def prescriptions_info(cls, user, prescriptions):
+        """To build the PrescriptionInfoMessage of some Prescriptions of a User
+
+        The Users of the Caregivers of the Prescriptions are fetched with a single batch get, each of them once.
+
+        :param user: The User entity the Prescriptions belong to
+        :param prescriptions: List of Prescription entities
+        :return: A list of PrescriptionInfoMessage, in the same order of the Prescriptions
+        """
+        caregiver_user_keys = list(set(prescription.caregiver.parent() for prescription in prescriptions
+                                       if prescription.caregiver is not None))
+        caregiver_users = dict(zip(caregiver_user_keys, ndb.get_multi(caregiver_user_keys)))
+
+        infos = []
+        for prescription in prescriptions:
+            prescription_info = PrescriptionInfoMessage(id=prescription.key.id(),
+                                                        name=prescription.name,
+                                                        active_ingr_key=prescription.active_ingr_key.id(),
+                                                        active_ingr_name=prescription.active_ingr_name,
+                                                        kind=prescription.kind,
+                                                        dose=prescription.dose, units=prescription.units,
+                                                        quantity=prescription.quantity,
+                                                        seen=prescription.seen,
+                                                        recipe=prescription.recipe, pil=prescription.pil,
+                                                        calendarIds=prescription.calendarIds,
+                                                        response=DefaultResponseMessage(code=OK,
+                                                                                        message="Prescription info retrieved."))
+
+            user_caregiver = caregiver_users.get(prescription.caregiver.parent()) \
+                if prescription.caregiver is not None else None
+            if user_caregiver:
+                prescription_info.caregiver_user_id = user_caregiver.key.id()
+                prescription_info.caregiver_id = prescription.caregiver.id()
+                prescription_info.caregiver_name = user_caregiver.name
+                prescription_info.caregiver_surname = user_caregiver.surname
+                prescription_info.caregiver_mail = user_caregiver.email
+                if user.pc_physician == prescription.caregiver:
+                    prescription_info.caregiver_job = "PC_PHYSICIAN"
+                elif user.visiting_nurse == prescription.caregiver:
+                    prescription_info.caregiver_job = "V_NURSE"
+                else:
+                    prescription_info.caregiver_job = "CAREGIVER"
+
+            infos.append(prescription_info)
+        return infos
+
+    @classmethod
+    def delete_all(cls, query, change_kind=None):
+        """To delete all the entities matched by a query
+
+        The keys are read DELETE_BATCH_SIZE at a time by a keys only query
+        and each batch is deleted with a single batch delete.
+
+        :param query: The query matching the entities to be deleted
+        :param change_kind: Kind of the entities (see CHANGE_KIND) if their deletion has to be logged
+        :return: The number of deleted entities
+        """
+        deleted = 0
+        cursor = None
+        more = True
+        while more:
+            keys, cursor, more = query.fetch_page(DELETE_BATCH_SIZE, keys_only=True, start_cursor=cursor)
+            ndb.delete_multi(keys)
+            if change_kind:
+                cls.log_changes(change_kind, keys, deleted=True)
+            deleted += len(keys)
+            more = more and cursor is not None
+        return deleted
+
+    @classmethod
+    def set_flag_async(cls, entities, name, change_kind):
+        """To set a boolean flag (e.g. hasRead) of some entities, writing only the changed ones
+
+        The changed entities are written, along with their change log entries, with a single
+        asynchronous batch put, so that the caller can build its response in the meantime.
+
+        :param entities: List of entities
+        :param name: Name of the boolean property to be set
+        :param change_kind: Kind of the entities (see CHANGE_KIND)
+        :return: A (set of the keys of the changed entities, list of the futures of the put) tuple
+        """
+        changed = [entity for entity in entities if not getattr(entity, name)]
+        for entity in changed:
+            setattr(entity, name, True)
+        changed_keys = [entity.key for entity in changed]
+        return set(changed_keys), ndb.put_multi_async(changed + cls.change_log_entries(change_kind, changed_keys))
+
+    @classmethod
+    def unread_messages_query(cls, user_key):
+        """To build the query of the unread Messages of some User, from the newest
+
+        It's shared by the listing and the count of the unread Messages, so they always agree.
+        The Messages not timestamped yet (see timestamp_messages) are not matched.
+
+        :param user_key: Key of the User entity
+        :return: The query
+        """
+        return Message.query(ancestor=user_key).filter(Message.hasRead == False).order(-Message.created)
+
+    @classmethod
+    def messages_info(cls, message_entities, with_measurement=False):
+        """To build the MessageInfoMessage of some Messages
+
+        The senders of the Messages (and their Measurements, if requested) are fetched
+        with a single batch get, each of them once.
+
+        :param message_entities: List of Message entities
+        :param with_measurement: True to embed a summary of the Measurement of each Message
+        :return: A list of MessageInfoMessage, in the same order of the Messages
+        """
+        keys = set(message.sender for message in message_entities)
+        if with_measurement:
+            keys.update(message.measurement for message in message_entities if message.measurement)
+        keys = list(keys)
+        entities = dict(zip(keys, ndb.get_multi(keys)))
+
+        infos = []
+        for message in message_entities:
+            sender = entities[message.sender]
+            info = MessageInfoMessage(id=message.key.id(), sender=message.sender.id(),
+                                      receiver=message.receiver.id(), message=message.message,
+                                      hasRead=message.hasRead, sender_pic=sender.pic if sender else None,
+                                      measurement=message.measurement.id() if message.measurement else None,
+                                      date_time=cls.format_date_time(message.created) if message.created else None)
+            measurement = entities.get(message.measurement) if with_measurement and message.measurement else None
+            if measurement:
+                info.measurement_info = MeasurementInfoMessage(id=measurement.key.id(), kind=measurement.kind,
+                                                               date_time=cls.format_date_time(measurement.date_time))
+                for name, _, _ in MEASUREMENTS_VALUES[measurement.kind]:
+                    setattr(info.measurement_info, name, getattr(measurement, name))
+            infos.append(info)
+        return infos
+
+    @classmethod
+    @ndb.transactional
+    def archive_user_messages(cls, user_key, message_keys, expiry):
+        """To move some read Messages received by a User into his newest MessageArchive
+
+        The Messages are read again within the transaction, so that only the ones
+        still read and older than expiry are archived. They're appended to the User's newest
+        MessageArchive, unless it would hold more than ARCHIVE_MAX_MESSAGES (then a new one is started).
+        Their deletion is logged into the User's change log, so that synchronized clients drop them.
+
+        :param user_key: Key of the receiver User's entity
+        :param message_keys: Keys of the Messages to be archived (at most ARCHIVE_BATCH_SIZE)
+        :param expiry: The (naive) UTC Day and Time the Messages must have been sent before
+        :return: The number of archived Messages
+        """
+        message_entities = [message for message in ndb.get_multi(message_keys)
+                            if message and message.hasRead and message.created and message.created < expiry]
+        if not message_entities:
+            return 0
+        rows = [(message.key.id(), message.sender, message.measurement, message.message, message.created)
+                for message in message_entities]
+        archive = MessageArchive.query(ancestor=user_key).order(-MessageArchive.newest).get()
+        if archive and len(archive.messages) + len(rows) <= ARCHIVE_MAX_MESSAGES:
+            rows.extend(archive.messages)
+        else:
+            archive = MessageArchive(parent=user_key)
+        rows.sort(key=lambda row: row[4], reverse=True)
+        archive.messages = rows
+        archive.newest = rows[0][4]
+        archive.put()
+        message_keys = [message.key for message in message_entities]
+        ndb.delete_multi(message_keys)
+        cls.log_changes("MESSAGE", message_keys, deleted=True)
+        return len(message_entities)
+
+    @classmethod
+    def archived_messages(cls, archive):
+        """To unpack the Messages of a MessageArchive
+
+        :param archive: A MessageArchive entity
+        :return: A list of (not stored) Message entities, from the newest
+        """
+        user_key = archive.key.parent()
+        return [Message(key=Key(Message, message_id, parent=user_key), sender=sender_key, receiver=user_key,
+                        message=text, hasRead=True, measurement=measurement_key, created=created)
+                for message_id, sender_key, measurement_key, text, created in archive.messages]
+
+    @classmethod
+    def request_lock_key(cls, kind, sender_key, receiver_key):
+        """To build the key of the RequestLock of the Requests of some kind between two Users
+
+        The key doesn't depend on which of the two Users sent the Request.
+
+        :param kind: Kind of the Request
+        :param sender_key: Key of the sender User's entity
+        :param receiver_key: Key of the receiver User's entity
+        :return: The key of the RequestLock entity
+        """
+        first_id, second_id = sorted([sender_key.id(), receiver_key.id()])
+        return Key(RequestLock, "%s:%s:%s" % (kind, first_id, second_id))
+
+    @classmethod
+    @ndb.transactional(xg=True)
+    def put_request(cls, new_request, lock_key):
+        """To store a new Request along with its RequestLock
+
+        :param new_request: The Request entity to be stored
+        :param lock_key: Key of the RequestLock of the Request (see request_lock_key)
+        :return: True if the Request has been stored, False if another Request already holds the lock
+        """
+        lock = lock_key.get()
+        if lock and lock.request.get():
+            return False
+        new_request.put()
+        RequestLock(key=lock_key, request=new_request.key, users=[new_request.sender, new_request.receiver]).put()
+        return True
+
+    @classmethod
+    @ndb.transactional(xg=True)
+    def delete_request_entity(cls, usr_request):
+        """To delete a Request along with its RequestLock
+
+        :param usr_request: The Request entity to be deleted
+        :return: Nothing (void)
+        """
+        lock_key = cls.request_lock_key(usr_request.kind, usr_request.sender, usr_request.receiver)
+        lock = lock_key.get()
+        if lock and lock.request == usr_request.key:
+            lock_key.delete()
+        usr_request.key.delete()
+
+    @classmethod
+    def requests_info(cls, request_entities, senders=None):
+        """To build the RequestInfoMessage of some Requests
+
+        The senders of the Requests are fetched with a single batch get, each of them once.
+
+        :param request_entities: List of Request entities
+        :param senders: Dictionary of the sender User entities already fetched, by key
+        :return: A list of RequestInfoMessage, in the same order of the Requests
+        """
+        senders = dict(senders or {})
+        sender_keys = list(set(usr_request.sender for usr_request in request_entities) - set(senders))
+        senders.update(zip(sender_keys, ndb.get_multi(sender_keys)))
+
+        infos = []
+        for usr_request in request_entities:
+            sender = senders[usr_request.sender]
+            info = RequestInfoMessage(id=usr_request.key.id(), receiver=usr_request.receiver.id(),
+                                      sender=usr_request.sender.id(), message=usr_request.message,
+                                      kind=usr_request.kind, role=usr_request.role, calendarId=usr_request.calendarId,
+                                      pending=usr_request.isPending,
+                                      caregiver=usr_request.caregiver.id() if usr_request.caregiver else None)
+            if sender:
+                info.sender_pic = sender.pic
+                info.sender_name = sender.name
+                info.sender_surname = sender.surname
+                info.sender_mail = sender.email
+            infos.append(info)
+        return infos
+
+    @classmethod
+    def alert_rules_cache_key(cls, user_key):
+        """To get the memcache key of the AlertRules of some User
+
+        :param user_key: Key of the User entity
+        :return: The memcache key of the User's AlertRules
+        """
+        return "alert-rules-%d" % user_key.id()
+
+    @classmethod
+    def get_alert_rules(cls, user_key):
+        """To get the AlertRules of some User, as cached for their evaluation
+
+        :param user_key: Key of the User entity
+        :return: A dictionary mapping each kind to a list of (caregiver id, value, operator, threshold) tuples
+        """
+        return cls.get_alert_rules_async(user_key).get_result()
+
+    @classmethod
+    @ndb.tasklet
+    def get_alert_rules_async(cls, user_key):
+        """To get the AlertRules of some User asynchronously (see get_alert_rules)
+
+        :param user_key: Key of the User entity
+        :return: A future of the User's AlertRules
+        """
+        context = ndb.get_context()
+        cache_key = cls.alert_rules_cache_key(user_key)
+        rules = yield context.memcache_get(cache_key)
+        if rules is None:
+            rules = {}
+            entities = yield AlertRule.query(ancestor=user_key).fetch_async()
+            for rule in entities:
+                rules.setdefault(rule.kind, []).append((rule.caregiver.id(), rule.value, rule.operator, rule.threshold))
+            yield context.memcache_set(cache_key, rules, time=ALERT_RULES_CACHE_SECONDS)
+        raise ndb.Return(rules)
+
+    @classmethod
+    def match_alert_rules(cls, rules, measurement):
+        """To evaluate the AlertRules of some User on one of his Measurements
+
+        :param rules: The User's AlertRules (see get_alert_rules)
+        :param measurement: A Measurement entity
+        :return: A list of the matching (caregiver id, value, operator, threshold) tuples
+        """
+        matches = []
+        for rule in rules.get(measurement.kind, ()):
+            value = getattr(measurement, rule[1])
+            if value is not None and ALERT_OPERATORS[rule[2]](value, rule[3]):
+                matches.append(rule)
+        return matches
+
+    @classmethod
+    def send_alerts(cls, user_key, measurements, previous=()):
+        """To alert the Caregivers of some User about his latest Measurements
+
+        For each AlertRule matched by a Measurement a Message linked to it is
+        sent from the User to the Caregiver who set the rule. An updated Measurement
+        is alerted only about the rules its previous version didn't match, so that
+        changing its note (or a value still matching a rule) doesn't alert again.
+
+        :param user_key: Key of the User entity the Measurements belong to
+        :param measurements: List of Measurement entities just stored (or updated)
+        :param previous: List of the previous versions of the updated Measurement entities
+        :return: The list of the keys of the Message entities sent
+        """
+        rules = cls.get_alert_rules(user_key)
+        if not rules:
+            return []
+
+        previous = dict((measurement.key, measurement) for measurement in previous)
+        now = datetime.utcnow()
+        alerts = []
+        for measurement in measurements:
+            matches = cls.match_alert_rules(rules, measurement)
+            if measurement.key in previous:
+                matched = cls.match_alert_rules(rules, previous[measurement.key])
+                matches = [rule for rule in matches if rule not in matched]
+            for caregiver_id, name, rule_operator, threshold in matches:
+                caregiver_key = Key(User, caregiver_id)
+                text = "Alert: %s %s %s (%s %s) on %s." % (measurement.kind, name, getattr(measurement, name),
+                                                           rule_operator, threshold,
+                                                           cls.format_date_time(measurement.date_time))
+                alerts.append(Message(parent=caregiver_key, sender=user_key, receiver=caregiver_key, message=text,
+                                      hasRead=False, measurement=measurement.key, created=now))
+        alert_keys = ndb.put_multi(alerts)
+        cls.log_changes("MESSAGE", alert_keys)
+        return alert_keys
+
+    @classmethod
+    def fetch_latest_readings(cls, user_keys, kind, readings):
+        """To query the latest Measurements of many Users concurrently
+
+        The Users are split among at most OVERVIEW_CONCURRENCY tasklets, each of
+        them querying the Measurements (and the AlertRules) of a User at a time.
+
+        :param user_keys: List of keys of the User entities
+        :param kind: Kind of the Measurements (any kind if None)
+        :param readings: Number of Measurements to be fetched for each User
+        :return: A dictionary mapping each User key to a (Measurements list, AlertRules) tuple
+        """
+        pending = list(reversed(user_keys))
+        latest = {}
+
+        @ndb.tasklet
+        def worker():
+            while pending:
+                user_key = pending.pop()
+                query = Measurement.query(ancestor=user_key)
+                if kind:
+                    query = query.filter(Measurement.kind == kind)
+                measurements_future = query.order(-Measurement.date_time).fetch_async(readings)
+                rules = yield cls.get_alert_rules_async(user_key)
+                measurements = yield measurements_future
+                latest[user_key] = (measurements, rules)
+
+        workers = [worker() for _ in range(min(OVERVIEW_CONCURRENCY, len(pending)))]
+        for future in workers:
+            future.get_result()
+        return latest
+
+    @classmethod
+    def delete_alert_rules(cls, user_key, caregiver_key=None):
+        """To delete the AlertRules on the Measurements of some User
+
+        :param user_key: Key of the User entity
+        :param caregiver_key: Key of the User entity of the Caregiver whose AlertRules have to be deleted
+                              (all the AlertRules if None)
+        :return: Nothing (void)
+        """
+        query = AlertRule.query(ancestor=user_key)
+        if caregiver_key:
+            query = query.filter(AlertRule.caregiver == caregiver_key)
+        ndb.delete_multi(query.fetch(keys_only=True))
+        memcache.delete(cls.alert_rules_cache_key(user_key))
+
+    @classmethod
+    def latest_measurements_key(cls, user_key):
+        """To get the key of the LatestMeasurements entity of some User
+
+        :param user_key: Key of the User entity
+        :return: The key of the User's LatestMeasurements entity
+        """
+        return Key(LatestMeasurements, user_key.id(), parent=user_key)
+
+    @classmethod
+    def refresh_latest_measurements(cls, user_key, stored=(), deleted=()):
+        """To keep the LatestMeasurements entity of some User up to date
+
+        This method has to be called within the transaction storing or
+        deleting the Measurements, on the User's entity group.
+
+        :param user_key: Key of the User entity the Measurements belong to
+        :param stored: List of Measurement entities just stored (or updated)
+        :param deleted: List of Measurement entities just deleted
+        :return: Nothing (void)
+        """
+        latest = cls.latest_measurements_key(user_key).get()
+        changed = False
+        if not latest:
+            latest = cls.build_latest_measurements(user_key)
+            changed = True
+
+        for measurement in stored:
+            current = latest.measurements.get(measurement.kind)
+            if current is None or current["id"] == measurement.key.id() or \
+               current["date_time"] <= measurement.date_time:
+                latest.measurements[measurement.kind] = cls.measurement_snapshot(measurement)
+                changed = True
+
+        for measurement in deleted:
+            current = latest.measurements.get(measurement.kind)
+            if current is None or current["id"] != measurement.key.id():
+                continue
+            # Deletes are not visible to the queries until the transaction is committed
+            candidates = Measurement.query(ancestor=user_key)\
+                                    .filter(Measurement.kind == measurement.kind)\
+                                    .order(-Measurement.date_time)\
+                                    .fetch(len(deleted) + 1)
+            deleted_keys = [entity.key for entity in deleted]
+            candidates = [candidate for candidate in candidates if candidate.key not in deleted_keys]
+            if candidates:
+                latest.measurements[measurement.kind] = cls.measurement_snapshot(candidates[0])
+            else:
+                del latest.measurements[measurement.kind]
+            changed = True
+
+        if changed:
+            latest.put()
+
+    @classmethod
+    @ndb.transactional
+    def rebuild_latest_measurements(cls, user_key):
+        """To build from scratch and store the LatestMeasurements entity of some User
+
+        :param user_key: Key of the User entity
+        :return: The new LatestMeasurements entity
+        """
+        latest = cls.build_latest_measurements(user_key)
+        latest.put()
+        return latest
+
+    @classmethod
+    def build_latest_measurements(cls, user_key):
+        """To build from scratch the LatestMeasurements entity of some User
+
+        This is needed for the Users whose Measurements were stored before
+        the LatestMeasurements entities were introduced.
+
+        :param user_key: Key of the User entity
+        :return: The new (not yet stored) LatestMeasurements entity
+        """
+        futures = [Measurement.query(ancestor=user_key)
+                              .filter(Measurement.kind == kind)
+                              .order(-Measurement.date_time)
+                              .get_async() for kind in MEASUREMENTS_KIND]
+
+        latest = LatestMeasurements(key=cls.latest_measurements_key(user_key), measurements={})
+        for future in futures:
+            measurement = future.get_result()
+            if measurement:
+                latest.measurements[measurement.kind] = cls.measurement_snapshot(measurement)
+        return latest
+
+    @classmethod
+    def measurement_snapshot(cls, measurement):
+        """To take a snapshot of a Measurement
+
+        :param measurement: A Measurement entity
+        :return: A dictionary with the Measurement's id, kind, date_time, values, note and calendarId
+        """
+        snapshot = {"id": measurement.key.id(), "kind": measurement.kind, "date_time": measurement.date_time,
+                    "note": measurement.note, "calendarId": measurement.calendarId}
+        for name, _, _ in MEASUREMENTS_VALUES[measurement.kind]:
+            snapshot[name] = getattr(measurement, name)
+        return snapshot
+
+    @classmethod
+    def refresh_measurement_stats(cls, user_key, stored=(), removed=()):
+        """To keep the MeasurementStats entities of some User up to date
+
+        This method has to be called within the transaction storing or deleting the
+        Measurements, on the User's entity group. Updating a Measurement means removing
+        its previous values and adding the new ones. When the statistics of a kind can't
+        be updated incrementally (i.e. a minimum or a maximum was removed, or the User has
+        Measurements older than the statistics) they're rebuilt by a deferred task.
+
+        :param user_key: Key of the User entity the Measurements belong to
+        :param stored: List of Measurement entities just stored (or updated)
+        :param removed: List of Measurement entities just deleted (or the previous versions of the updated ones)
+        :return: Nothing (void)
+        """
+        kinds = set(measurement.kind for measurement in list(stored) + list(removed))
+        stats_keys = [Key(MeasurementStats, kind, parent=user_key) for kind in kinds]
+        all_stats = {}
+        to_rebuild = []
+        for stats_key, stats in zip(stats_keys, ndb.get_multi(stats_keys)):
+            if not stats:
+                stats = MeasurementStats(key=stats_key, values={}, days={})
+                # Queries don't see the writes of the running transaction
+                if Measurement.query(ancestor=user_key)\
+                              .filter(Measurement.kind == stats_key.id())\
+                              .get(keys_only=True):
+                    stats.stale = True
+                    to_rebuild.append(stats_key.id())
+            all_stats[stats_key.id()] = stats
+
+        first_day = datetime.utcnow().date().toordinal() - STATS_TREND_DAYS + 1
+        for sign, measurements in ((-1, removed), (1, stored)):
+            for measurement in measurements:
+                stats = all_stats[measurement.kind]
+                if not cls.apply_measurement_stats(stats, measurement, sign, first_day) and not stats.stale:
+                    stats.stale = True
+                    to_rebuild.append(measurement.kind)
+
+        for stats in all_stats.values():
+            for day in [day for day in stats.days if day < first_day]:
+                del stats.days[day]
+            stats.generation += 1
+        ndb.put_multi(all_stats.values())
+        if to_rebuild:
+            deferred.defer(rebuild_measurement_stats, user_key, to_rebuild, _transactional=True)
+
+    @classmethod
+    def apply_measurement_stats(cls, stats, measurement, sign, first_day):
+        """To add (or remove) the values of a Measurement to the statistics of its kind
+
+        :param stats: The MeasurementStats entity of the Measurement's kind
+        :param measurement: A Measurement entity
+        :param sign: 1 to add the Measurement's values, -1 to remove them
+        :param first_day: First day (as a proleptic Gregorian ordinal) taken into account for the trend
+        :return: False if the minimum or the maximum may be out of date, True otherwise
+        """
+        up_to_date = True
+        day = measurement.date_time.date().toordinal()
+        for name, _, _ in MEASUREMENTS_VALUES[measurement.kind]:
+            value = getattr(measurement, name)
+            if value is None:
+                continue
+            accumulator = stats.values.setdefault(name, [0, 0.0, 0.0, None, None])
+            count, mean, m2, minimum, maximum = accumulator
+            if sign > 0:
+                count += 1
+                delta = value - mean
+                mean += delta / float(count)
+                m2 += delta * (value - mean)
+                minimum = value if minimum is None else min(minimum, value)
+                maximum = value if maximum is None else max(maximum, value)
+            elif count > 1:
+                previous_mean = (count * mean - value) / float(count - 1)
+                m2 = max(m2 - (value - previous_mean) * (value - mean), 0.0)
+                count -= 1
+                mean = previous_mean
+                if minimum is None or value <= minimum or value >= maximum:
+                    up_to_date = False
+            else:
+                if count < 1:
+                    up_to_date = False
+                count, mean, m2, minimum, maximum = 0, 0.0, 0.0, None, None
+            accumulator[:] = [count, mean, m2, minimum, maximum]
+
+            if day >= first_day:
+                day_sums = stats.days.setdefault(day, {}).setdefault(name, [0, 0.0])
+                day_sums[0] += sign
+                day_sums[1] += sign * value
+        return up_to_date
+
+    @classmethod
+    def measurement_stats_trend(cls, stats, name, first_day):
+        """To compute the recent trend of a Measurement's value
+
+        :param stats: A MeasurementStats entity
+        :param name: Name of the value
+        :param first_day: First day (as a proleptic Gregorian ordinal) taken into account
+        :return: A (mean, daily variation) tuple, each None if there are not enough Measurements
+        """
+        points = []
+        count = 0
+        total = 0.0
+        for day, day_sums in stats.days.items():
+            day_count, day_total = day_sums.get(name, (0, 0.0))
+            if day >= first_day and day_count > 0:
+                points.append((day, day_total / day_count))
+                count += day_count
+                total += day_total
+        if not count:
+            return None, None
+        if len(points) < 2:
+            return total / count, None
+
+        mean_day = sum(day for day, _ in points) / float(len(points))
+        mean_value = sum(value for _, value in points) / len(points)
+        covariance = sum((day - mean_day) * (value - mean_value) for day, value in points)
+        variance = sum((day - mean_day) ** 2 for day, _ in points)
+        return total / count, covariance / variance
+
+    @classmethod
+    def refresh_measurement_months(cls, user_key, stored=(), deleted=()):
+        """To keep the MeasurementMonth entities of some User up to date
+
+        This method has to be called within the transaction storing or deleting
+        the Measurements, on the User's entity group. Storing a Measurement already
+        packed into its MeasurementMonth replaces it, so it can be safely repeated.
+
+        :param user_key: Key of the User entity the Measurements belong to
+        :param stored: List of Measurement entities just stored (or updated)
+        :param deleted: List of Measurement entities just deleted
+        :return: Nothing (void)
+        """
+        changes = {}
+        for measurement in list(stored) + list(deleted):
+            month_id = "%s-%04d%02d" % (measurement.kind, measurement.date_time.year, measurement.date_time.month)
+            removed, added = changes.setdefault(month_id, (set(), []))
+            removed.add(measurement.key.id())
+        for measurement in stored:
+            month_id = "%s-%04d%02d" % (measurement.kind, measurement.date_time.year, measurement.date_time.month)
+            changes[month_id][1].append(measurement)
+
+        month_keys = [Key(MeasurementMonth, month_id, parent=user_key) for month_id in changes]
+        to_put = []
+        to_delete = []
+        for month_key, measurement_month in zip(month_keys, ndb.get_multi(month_keys)):
+            removed, added = changes[month_key.id()]
+            kind, month = month_key.id().rsplit("-", 1)
+            values = MEASUREMENTS_VALUES[kind]
+
+            rows = []
+            if measurement_month:
+                rows = [row for row in cls.measurement_month_rows(measurement_month) if row[1] not in removed]
+            for measurement in added:
+                row_values = []
+                for name, _, _ in values:
+                    value = getattr(measurement, name)
+                    row_values.append(float(value) if value is not None else float("nan"))
+                rows.append((cls.to_timestamp(measurement.date_time), measurement.key.id(), tuple(row_values)))
+
+            if not rows:
+                if measurement_month:
+                    to_delete.append(month_key)
+                continue
+
+            rows.sort()
+            timestamps = array("d", [row[0] for row in rows])
+            packed_values = array("d")
+            for row in rows:
+                packed_values.extend(row[2])
+            to_put.append(MeasurementMonth(key=month_key, kind=kind, month=int(month),
+                                           ids=[row[1] for row in rows],
+                                           timestamps=timestamps.tostring(),
+                                           values=packed_values.tostring()))
+
+        ndb.put_multi(to_put)
+        ndb.delete_multi(to_delete)
+
+    @classmethod
+    def measurement_month_rows(cls, measurement_month):
+        """To unpack the rows of a MeasurementMonth entity
+
+        :param measurement_month: A MeasurementMonth entity
+        :return: A list of (timestamp, Measurement id, values tuple) sorted by timestamp
+        """
+        width = len(MEASUREMENTS_VALUES[measurement_month.kind])
+        timestamps = array("d")
+        timestamps.fromstring(measurement_month.timestamps or "")
+        values = array("d")
+        values.fromstring(measurement_month.values or "")
+        return [(timestamps[i], measurement_month.ids[i], tuple(values[i * width:(i + 1) * width]))
+                for i in range(len(timestamps))]
+
+    @classmethod
+    def iter_measurements_history(cls, user_key, kind):
+        """To lazily read the whole history of a kind of Measurements of some User
+
+        The history is read from the MeasurementMonth entities, one month at a time,
+        so it needs COLUMNAR_MEASUREMENTS enabled and the migration job to be run.
+
+        :param user_key: Key of the User entity
+        :param kind: Kind of the Measurements
+        :return: A generator of (UTC datetime, Measurement id, values tuple) from the oldest to the newest
+        """
+        months = MeasurementMonth.query(ancestor=user_key)\
+                                 .filter(MeasurementMonth.kind == kind)\
+                                 .order(MeasurementMonth.month)
+        for measurement_month in months.iter(batch_size=3):
+            for timestamp, measurement_id, values in cls.measurement_month_rows(measurement_month):
+                yield datetime.utcfromtimestamp(timestamp), measurement_id, values
+
+    @classmethod
+    def measurement_from_row(cls, kind, date_time, values):
+        """To build a Measurement from a row of a MeasurementMonth entity
+
+        :param kind: Kind of the Measurement
+        :param date_time: UTC Day and Time of the Measurement
+        :param values: Tuple of the values of the Measurement, ordered as in MEASUREMENTS_VALUES
+        :return: A (not stored) Measurement entity, without note and calendarId
+        """
+        measurement = Measurement(kind=kind, date_time=date_time)
+        for (name, _, _), value in zip(MEASUREMENTS_VALUES[kind], values):
+            if math.isnan(value):
+                continue
+            if isinstance(getattr(Measurement, name), ndb.IntegerProperty):
+                value = int(value)
+            setattr(measurement, name, value)
+        return measurement
+
+    @classmethod
+    def export_chunk(cls, measurements, export_format, header):
+        """To serialize a batch of Measurements for an export
+
+        :param measurements: List of Measurement entities
+        :param export_format: Format of the exported file (see EXPORT_FORMAT)
+        :param header: True if the chunk is the first one of the file
+        :return: The UTF-8 encoded chunk
+        """
+        names = []
+        for kind in MEASUREMENTS_KIND:
+            names.extend(name for name, _, _ in MEASUREMENTS_VALUES[kind])
+
+        if export_format == "NDJSON":
+            lines = []
+            for measurement in measurements:
+                row = {"id": measurement.key.id(), "kind": measurement.kind, "note": measurement.note,
+                       "date_time": cls.format_date_time(measurement.date_time)}
+                for name, _, _ in MEASUREMENTS_VALUES[measurement.kind]:
+                    row[name] = getattr(measurement, name)
+                lines.append(json.dumps(row, sort_keys=True) + "\n")
+            return "".join(lines).encode("utf-8")
+
+        output = StringIO.StringIO()
+        writer = csv.writer(output)
+        if header:
+            writer.writerow(["id", "date_time", "kind"] + names + ["note"])
+        for measurement in measurements:
+            row = [measurement.key.id(), cls.format_date_time(measurement.date_time), measurement.kind]
+            row.extend(getattr(measurement, name) for name in names)
+            row.append(measurement.note.encode("utf-8") if measurement.note else None)
+            writer.writerow(row)
+        return output.getvalue()
+
+    @classmethod
+    def to_timestamp(cls, date_time):
+        """To convert a Day and Time to a timestamp
+
+        :param date_time: A (naive) UTC datetime
+        :return: The corresponding UTC timestamp (seconds since the epoch, as a float)
+        """
+        return calendar.timegm(date_time.utctimetuple()) + date_time.microsecond / 1000000.0
+
+    @classmethod
+    def format_date_time(cls, date_time):
+        """To format a Day and Time for the mobile application
+
+        :param date_time: A (naive) UTC datetime
+        :return: The corresponding "%Y-%m-%d %H:%M:%S" string in the Europe/Rome timezone
+        """
+        utc = date_time.replace(tzinfo=pytz.timezone('UTC'))
+        return datetime.strftime(utc.astimezone(pytz.timezone('Europe/Rome')), "%Y-%m-%d %H:%M:%S")
+
+    @classmethod
+    def parse_date_time(cls, date_time):
+        """To parse a Day and Time sent by the mobile application
+
+        Day and Time are exchanged with the mobile application in the
+        Europe/Rome timezone, while they're stored in UTC.
+
+        :param date_time: A "%Y-%m-%d %H:%M:%S" string in the Europe/Rome timezone
+        :return: The corresponding (naive) UTC datetime
+        :raise ValueError: If the string is not well formatted
+        """
+        central = pytz.timezone('Europe/Rome').localize(datetime.strptime(date_time, "%Y-%m-%d %H:%M:%S"))
+        return central.astimezone(pytz.timezone('UTC')).replace(tzinfo=None)
+
+    @classmethod
+    def authentication_check(cls):
+        """To check User Credentials
+
+        This method is used at the beginning of each RPC method offered by
+        the backend to check the user credentials against OAuth 2.0
+        authentication requested by the web service to interact with it.
+
+        :return: Nothing (void)
+        """
+        current_user = endpoints.get_current_user()
+        if not current_user:
+            raise endpoints.UnauthorizedException('Invalid token.')
+
+    @classmethod
+    def return_response(cls, code, message, response):
+        """ To return the response logging the operation's results
+
+        :param code: The HTTP code resulting by the RPC invocation
+        :param message: The message to be displayed
+        :param response: The overall response to be sent back to the User
+        :return: The response given as input
+        """
+        logging.info("CODE: %s " % code)
+        logging.info("MESSAGE: %s " % message)
+        return response
+
+
+# BACKGROUND TASKS
+def migrate_measurements(cursor=None):
+    """To pack the existing Measurements into MeasurementMonth entities
+
+    This deferred task walks all the Measurements in batches of MIGRATION_BATCH_SIZE,
+    packing each batch into the MeasurementMonth entities of their Users, then it
+    enqueues itself to go on from where it stopped. It can be safely run again.
+    It doesn't run if COLUMNAR_MEASUREMENTS is disabled: the MeasurementMonth entities
+    wouldn't be kept up to date by the following writes.
+
+    :param cursor: Urlsafe string of the query cursor to start from
+    :return: Nothing (void)
+    """
+    if not COLUMNAR_MEASUREMENTS:
+        logging.warning("Measurements migration not started: COLUMNAR_MEASUREMENTS is disabled.")
+        return
+
+    start_cursor = Cursor(urlsafe=cursor) if cursor else None
+    measurements, next_cursor, more = Measurement.query().fetch_page(MIGRATION_BATCH_SIZE,
+                                                                     start_cursor=start_cursor)
+
+    users_measurements = {}
+    for measurement in measurements:
+        users_measurements.setdefault(measurement.key.parent(), []).append(measurement)
+    for user_key, user_measurements in users_measurements.items():
+        ndb.transaction(lambda: RecipexServerApi.refresh_measurement_months(user_key, stored=user_measurements))
+
+    logging.info("Measurements migrated: %d" % len(measurements))
+    if more and next_cursor:
+        deferred.defer(migrate_measurements, next_cursor.urlsafe())
+    else:
+        logging.info("Measurements migration completed.")
+
+
+def write_measurement_export(export_key, chunk):
+    """To write the next chunk of a Measurements' export
+
+    This deferred task writes a chunk of at most EXPORT_BATCH_SIZE Measurements,
+    walking the User's Measurements from the oldest with a query cursor, then it
+    enqueues itself for the following chunk. Tasks for an already written chunk
+    are ignored, so retries don't duplicate the chunks. Columnar exports walk the
+    MeasurementMonth entities instead, EXPORT_BATCH_MONTHS at a time (without the notes).
+
+    :param export_key: Key of the MeasurementExport entity
+    :param chunk: Number of the chunk to be written
+    :return: Nothing (void)
+    """
+    export = export_key.get()
+    if not export or export.completed or export.num_chunks != chunk - 1:
+        return
+
+    user_key = export_key.parent()
+    start_cursor = Cursor(urlsafe=export.cursor) if export.cursor else None
+    if export.columnar:
+        months, next_cursor, more = MeasurementMonth.query(ancestor=user_key)\
+                                                    .order(MeasurementMonth.month)\
+                                                    .fetch_page(EXPORT_BATCH_MONTHS, start_cursor=start_cursor)
+        measurements = []
+        for measurement_month in months:
+            for timestamp, measurement_id, values in RecipexServerApi.measurement_month_rows(measurement_month):
+                measurement = RecipexServerApi.measurement_from_row(measurement_month.kind,
+                                                                    datetime.utcfromtimestamp(timestamp), values)
+                measurement.key = Key(Measurement, measurement_id, parent=user_key)
+                measurements.append(measurement)
+        measurements.sort(key=lambda measurement: measurement.date_time)
+    else:
+        measurements, next_cursor, more = Measurement.query(ancestor=user_key)\
+                                                     .order(Measurement.date_time)\
+                                                     .fetch_page(EXPORT_BATCH_SIZE, start_cursor=start_cursor)
+    data = RecipexServerApi.export_chunk(measurements, export.format, chunk == 1)
+
+    @ndb.transactional
+    def store_chunk():
+        current = export_key.get()
+        if current.num_chunks != chunk - 1:
+            return
+        current.num_chunks = chunk
+        current.num_measurements += len(measurements)
+        current.completed = not (more and next_cursor)
+        current.cursor = next_cursor.urlsafe() if next_cursor else None
+        ndb.put_multi([current, MeasurementExportChunk(parent=export_key, id=chunk, data=data)])
+        if not current.completed:
+            deferred.defer(write_measurement_export, export_key, chunk + 1, _transactional=True)
+
+    store_chunk()
+
+
+def rebuild_measurement_stats(user_key, kinds):
+    """To rebuild from scratch the MeasurementStats entities of some User
+
+    This deferred task walks all the User's Measurements of each kind outside of any
+    transaction, then it stores the rebuilt statistics within a short transaction only if
+    the generation of the MeasurementStats entity didn't change meanwhile. Otherwise a
+    Measurement was written during the walk, so the kind is left to a new run of the task.
+    If COLUMNAR_MEASUREMENTS_READS is enabled they're read from the MeasurementMonth entities.
+
+    :param user_key: Key of the User entity
+    :param kinds: List of the kinds of Measurements whose statistics have to be rebuilt
+    :return: Nothing (void)
+    """
+    first_day = datetime.utcnow().date().toordinal() - STATS_TREND_DAYS + 1
+
+    @ndb.transactional
+    def store(stats, generation):
+        current = stats.key.get()
+        if (current.generation if current else None) != generation:
+            return False
+        if stats.values:
+            stats.put()
+        elif current:
+            stats.key.delete()
+        return True
+
+    changed = []
+    for kind in set(kinds):
+        stats_key = Key(MeasurementStats, kind, parent=user_key)
+        current = stats_key.get()
+        generation = current.generation if current else None
+        stats = MeasurementStats(key=stats_key, values={}, days={}, generation=(generation or 0) + 1)
+        if COLUMNAR_MEASUREMENTS_READS:
+            measurements = (RecipexServerApi.measurement_from_row(kind, date_time, values)
+                            for date_time, _, values in RecipexServerApi.iter_measurements_history(user_key, kind))
+        else:
+            measurements = Measurement.query(ancestor=user_key).filter(Measurement.kind == kind)\
+                                      .iter(batch_size=EXPORT_BATCH_SIZE)
+        for measurement in measurements:
+            RecipexServerApi.apply_measurement_stats(stats, measurement, 1, first_day)
+        if not store(stats, generation):
+            changed.append(kind)
+
+    if changed:
+        logging.info("Measurement stats changed while rebuilding, retrying: %s" % ", ".join(changed))
+        deferred.defer(rebuild_measurement_stats, user_key, changed)
+
+
+def rebuild_all_measurement_stats(cursor=None):
+    """To rebuild the MeasurementStats entities of all the Users
+
+    This deferred task walks the Users in batches of MIGRATION_BATCH_SIZE, enqueueing
+    a rebuild_measurement_stats task for each of them, then it enqueues itself to
+    go on from where it stopped. It's needed to backfill the statistics of the Measurements
+    stored before the MeasurementStats entities were introduced.
+
+    :param cursor: Urlsafe string of the query cursor to start from
+    :return: Nothing (void)
+    """
+    start_cursor = Cursor(urlsafe=cursor) if cursor else None
+    user_keys, next_cursor, more = User.query().fetch_page(MIGRATION_BATCH_SIZE, keys_only=True,
+                                                           start_cursor=start_cursor)
+    for user_key in user_keys:
+        deferred.defer(rebuild_measurement_stats, user_key, MEASUREMENTS_KIND)
+
+    logging.info("Measurement stats rebuilds enqueued: %d" % len(user_keys))
+    if more and next_cursor:
+        deferred.defer(rebuild_all_measurement_stats, next_cursor.urlsafe())
+
+
+def timestamp_messages(cursor=None):
+    """To give a Day and Time to the Messages sent before they were timestamped
+
+    This deferred task walks all the Messages in batches of MIGRATION_BATCH_SIZE, setting
+    the created property of the ones without it to the Day and Time of their Measurement
+    (or to LEGACY_MESSAGE_DATE), then it enqueues itself to go on from where it stopped.
+    Messages without it are not listed by get_messages. It can be safely run again.
+
+    :param cursor: Urlsafe string of the query cursor to start from
+    :return: Nothing (void)
+    """
+    start_cursor = Cursor(urlsafe=cursor) if cursor else None
+    message_entities, next_cursor, more = Message.query().fetch_page(MIGRATION_BATCH_SIZE,
+                                                                     start_cursor=start_cursor)
+
+    legacy = [message for message in message_entities if message.created is None]
+    measurement_keys = list(set(message.measurement for message in legacy if message.measurement))
+    measurements = dict(zip(measurement_keys, ndb.get_multi(measurement_keys)))
+    for message in legacy:
+        measurement = measurements.get(message.measurement)
+        message.created = measurement.date_time if measurement else LEGACY_MESSAGE_DATE
+    ndb.put_multi(legacy)
+
+    logging.info("Messages timestamped: %d" % len(legacy))
+    if more and next_cursor:
+        deferred.defer(timestamp_messages, next_cursor.urlsafe())
+    else:
+        logging.info("Messages timestamping completed.")
+
+
+def lock_requests(cursor=None):
+    """To create the RequestLock of the Requests sent before they were locked
+
+    This deferred task walks all the Requests in batches of MIGRATION_BATCH_SIZE, creating
+    the missing RequestLock entities, then it enqueues itself to go on from where it stopped.
+    Without it a Request sent before the locks were introduced doesn't prevent a duplicate one.
+    It can be safely run again.
+
+    :param cursor: Urlsafe string of the query cursor to start from
+    :return: Nothing (void)
+    """
+    start_cursor = Cursor(urlsafe=cursor) if cursor else None
+    request_entities, next_cursor, more = Request.query().fetch_page(MIGRATION_BATCH_SIZE,
+                                                                     start_cursor=start_cursor)
+
+    requests_by_lock = {}
+    for usr_request in request_entities:
+        lock_key = RecipexServerApi.request_lock_key(usr_request.kind, usr_request.sender, usr_request.receiver)
+        requests_by_lock.setdefault(lock_key, usr_request)
+    lock_keys = list(requests_by_lock.keys())
+    locks = [RequestLock(key=lock_key, request=requests_by_lock[lock_key].key,
+                         users=[requests_by_lock[lock_key].sender, requests_by_lock[lock_key].receiver])
+             for lock_key, lock in zip(lock_keys, ndb.get_multi(lock_keys)) if lock is None]
+    ndb.put_multi(locks)
+
+    logging.info("Request locks created: %d" % len(locks))
+    if more and next_cursor:
+        deferred.defer(lock_requests, next_cursor.urlsafe())
+    else:
+        logging.info("Requests locking completed.")
+
+
+def timestamp_requests(cursor=None):
+    """To give a Day and Time to the Requests sent before they were timestamped
+
+    This deferred task walks all the Requests in batches of MIGRATION_BATCH_SIZE, setting
+    the created property of the ones without it to the current Day and Time, then it enqueues
+    itself to go on from where it stopped. Requests without it never expire. It can be safely run again.
+
+    :param cursor: Urlsafe string of the query cursor to start from
+    :return: Nothing (void)
+    """
+    start_cursor = Cursor(urlsafe=cursor) if cursor else None
+    request_entities, next_cursor, more = Request.query().fetch_page(MIGRATION_BATCH_SIZE,
+                                                                     start_cursor=start_cursor)
+
+    legacy = [usr_request for usr_request in request_entities if usr_request.created is None]
+    now = datetime.utcnow()
+    for usr_request in legacy:
+        usr_request.created = now
+    ndb.put_multi(legacy)
+
+    logging.info("Requests timestamped: %d" % len(legacy))
+    if more and next_cursor:
+        deferred.defer(timestamp_requests, next_cursor.urlsafe())
+    else:
+        logging.info("Requests timestamping completed.")
+
+
+def cleanup_requests(cursor=None):
+    """To delete the Requests not answered within REQUEST_TTL_DAYS
+
+    This deferred task walks the expired Requests in batches of DELETE_BATCH_SIZE, deleting
+    each batch along with the RequestLock entities they hold with a single batch delete,
+    then it enqueues itself to go on from where it stopped.
+
+    :param cursor: Urlsafe string of the query cursor to start from
+    :return: Nothing (void)
+    """
+    expiry = datetime.utcnow() - timedelta(days=REQUEST_TTL_DAYS)
+    start_cursor = Cursor(urlsafe=cursor) if cursor else None
+    request_entities, next_cursor, more = Request.query(Request.created < expiry)\
+                                                 .fetch_page(DELETE_BATCH_SIZE, start_cursor=start_cursor)
+
+    lock_keys = [RecipexServerApi.request_lock_key(usr_request.kind, usr_request.sender, usr_request.receiver)
+                 for usr_request in request_entities]
+    request_keys = [usr_request.key for usr_request in request_entities]
+    held_keys = [lock.key for lock, request_key in zip(ndb.get_multi(lock_keys), request_keys)
+                 if lock and lock.request == request_key]
+    ndb.delete_multi(request_keys + held_keys)
+    RecipexServerApi.log_changes("REQUEST", request_keys, deleted=True,
+                                 also_notify=[usr_request.sender for usr_request in request_entities])
+
+    logging.info("Expired requests deleted: %d" % len(request_keys))
+    if more and next_cursor:
+        deferred.defer(cleanup_requests, next_cursor.urlsafe())
+
+
+def archive_messages(cursor=None):
+    """To archive the read Messages older than ARCHIVE_MESSAGES_DAYS
+
+    This deferred task reads the keys of ARCHIVE_BATCH_SIZE old read Messages at a time and
+    moves the ones of each User into his newest MessageArchive (see archive_user_messages), then it
+    enqueues itself to go on from where it stopped.
+
+    :param cursor: Urlsafe string of the query cursor to start from
+    :return: Nothing (void)
+    """
+    expiry = datetime.utcnow() - timedelta(days=ARCHIVE_MESSAGES_DAYS)
+    start_cursor = Cursor(urlsafe=cursor) if cursor else None
+    message_keys, next_cursor, more = Message.query(Message.hasRead == True, Message.created < expiry)\
+                                             .fetch_page(ARCHIVE_BATCH_SIZE, keys_only=True,
+                                                         start_cursor=start_cursor)
+
+    keys_by_user = {}
+    for message_key in message_keys:
+        keys_by_user.setdefault(message_key.parent(), []).append(message_key)
+    archived = 0
+    for user_key, user_message_keys in keys_by_user.items():
+        archived += RecipexServerApi.archive_user_messages(user_key, user_message_keys, expiry)
+
+    logging.info("Messages archived: %d" % archived)
+    if more and next_cursor:
+        deferred.defer(archive_messages, next_cursor.urlsafe())
+
+
+def fan_out_broadcast(broadcast_key):
+    """To send the Messages of a Broadcast
+
+    This deferred task writes the Messages of a Broadcast BROADCAST_BATCH_SIZE at a time,
+    each batch within a cross group transaction which also stores the progress of
+    the Broadcast, so a retried task never sends a Message twice. After
+    BROADCAST_BATCHES_PER_TASK batches it enqueues itself to go on.
+
+    :param broadcast_key: Key of the Broadcast entity
+    :return: Nothing (void)
+    """
+    @ndb.transactional(xg=True)
+    def send_batch():
+        broadcast = broadcast_key.get()
+        if not broadcast or broadcast.completed:
+            return False
+        receivers = broadcast.receivers[broadcast.sent:broadcast.sent + BROADCAST_BATCH_SIZE]
+        now = datetime.utcnow()
+        message_keys = ndb.put_multi([Message(parent=receiver_key, sender=broadcast_key.parent(),
+                                              receiver=receiver_key, message=broadcast.message, hasRead=False,
+                                              created=now)
+                                      for receiver_key in receivers])
+        RecipexServerApi.log_changes("MESSAGE", message_keys)
+        broadcast.sent += len(receivers)
+        broadcast.completed = broadcast.sent >= len(broadcast.receivers)
+        broadcast.put()
+        return not broadcast.completed
+
+    for _ in range(BROADCAST_BATCHES_PER_TASK):
+        if not send_batch():
+            return
+    deferred.defer(fan_out_broadcast, broadcast_key)
+
+
+def cleanup_measurement_dedupes():
+    """To delete the MeasurementDedupe entities older than MEASUREMENT_DEDUPE_HOURS
+
+    :return: Nothing (void)
+    """
+    expiry = datetime.utcnow() - timedelta(hours=MEASUREMENT_DEDUPE_HOURS)
+    deleted = RecipexServerApi.delete_all(MeasurementDedupe.query(MeasurementDedupe.created < expiry))
+    logging.info("Measurement dedupe keys deleted: %d" % deleted)
+
+
+def cleanup_legacy_measurement_dedupes(cursor=None):
+    """To delete the expired MeasurementDedupe entities stored before their created property was indexed
+
+    Those entities are not matched by the query of cleanup_measurement_dedupes, so this deferred
+    task walks all the MeasurementDedupe entities in batches of MIGRATION_BATCH_SIZE, deleting the
+    expired ones. It has to be run once and it can be safely run again.
+
+    :param cursor: Urlsafe string of the query cursor to start from
+    :return: Nothing (void)
+    """
+    expiry = datetime.utcnow() - timedelta(hours=MEASUREMENT_DEDUPE_HOURS)
+    start_cursor = Cursor(urlsafe=cursor) if cursor else None
+    dedupes, next_cursor, more = MeasurementDedupe.query().fetch_page(MIGRATION_BATCH_SIZE,
+                                                                      start_cursor=start_cursor)
+
+    expired = [dedupe.key for dedupe in dedupes if dedupe.created < expiry]
+    ndb.delete_multi(expired)
+
+    logging.info("Legacy measurement dedupe keys deleted: %d" % len(expired))
+    if more and next_cursor:
+        deferred.defer(cleanup_legacy_measurement_dedupes, next_cursor.urlsafe())
+    else:
+        logging.info("Legacy measurement dedupe keys cleanup completed.")
+
+
+def cleanup_change_log():
+    """To delete the ChangeLogEntry entities older than CHANGE_LOG_DAYS
+
+    :return: Nothing (void)
+    """
+    expiry = datetime.utcnow() - timedelta(days=CHANGE_LOG_DAYS)
+    deleted = RecipexServerApi.delete_all(ChangeLogEntry.query(ChangeLogEntry.created < expiry))
+    logging.info("Change log entries deleted: %d" % deleted)
+
+
+class MigrateMeasurementsHandler(webapp2.RequestHandler):
+    """Handler starting the migration of the Measurements to MeasurementMonth entities"""
+    def get(self):
+        if not COLUMNAR_MEASUREMENTS:
+            self.response.set_status(412)
+            self.response.write("COLUMNAR_MEASUREMENTS is disabled.")
+            return
+        deferred.defer(migrate_measurements)
+        self.response.write("Measurements migration started.")
+
+
+class RebuildMeasurementStatsHandler(webapp2.RequestHandler):
+    """Handler starting the rebuild of the MeasurementStats entities of all the Users"""
+    def get(self):
+        deferred.defer(rebuild_all_measurement_stats)
+        self.response.write("Measurement stats rebuild started.")
+
+
+class TimestampMessagesHandler(webapp2.RequestHandler):
+    """Handler starting the timestamping of the Messages sent before they were timestamped"""
+    def get(self):
+        deferred.defer(timestamp_messages)
+        self.response.write("Messages timestamping started.")
+
+
+class LockRequestsHandler(webapp2.RequestHandler):
+    """Handler starting the creation of the locks of the Requests sent before they were locked"""
+    def get(self):
+        deferred.defer(lock_requests)
+        self.response.write("Requests locking started.")
+
+
+class TimestampRequestsHandler(webapp2.RequestHandler):
+    """Handler starting the timestamping of the Requests sent before they were timestamped"""
+    def get(self):
+        deferred.defer(timestamp_requests)
+        self.response.write("Requests timestamping started.")
+
+
+class CleanupRequestsHandler(webapp2.RequestHandler):
+    """Handler starting the deletion of the expired Requests (run by cron, see cron.yaml)"""
+    def get(self):
+        deferred.defer(cleanup_requests)
+        self.response.write("Requests cleanup started.")
+
+
+class ArchiveMessagesHandler(webapp2.RequestHandler):
+    """Handler starting the archiving of the old read Messages (run by cron, see cron.yaml)"""
+    def get(self):
+        deferred.defer(archive_messages)
+        self.response.write("Messages archiving started.")
+
+
+class CleanupMeasurementDedupesHandler(webapp2.RequestHandler):
+    """Handler starting the deletion of the expired Measurements' client side keys (run by cron, see cron.yaml)
+
+    With ?legacy=true it deletes the expired keys stored before they were indexed instead.
+    """
+    def get(self):
+        if self.request.get("legacy") == "true":
+            deferred.defer(cleanup_legacy_measurement_dedupes)
+        else:
+            deferred.defer(cleanup_measurement_dedupes)
+        self.response.write("Measurement dedupe keys cleanup started.")
+
+
+class CleanupChangeLogHandler(webapp2.RequestHandler):
+    """Handler starting the deletion of the expired change log entries (run by cron, see cron.yaml)"""
+    def get(self):
+        deferred.defer(cleanup_change_log)
+        self.response.write("Change log cleanup started.")
+
+
+"""Web Service instance initialization"""
+APPLICATION = endpoints.api_server([RecipexServerApi])
+
+"""Background tasks instance initialization (admin only, see app.yaml)"""
+TASKS = webapp2.WSGIApplication([
+    ("/tasks/measurements/migrate", MigrateMeasurementsHandler),
+    ("/tasks/measurements/stats/rebuild", RebuildMeasurementStatsHandler),
+    ("/tasks/measurements/dedupe/cleanup", CleanupMeasurementDedupesHandler),
+    ("/tasks/messages/timestamp", TimestampMessagesHandler),
+    ("/tasks/messages/archive", ArchiveMessagesHandler),
+    ("/tasks/requests/lock", LockRequestsHandler),
+    ("/tasks/requests/timestamp", TimestampRequestsHandler),
+    ("/tasks/requests/cleanup", CleanupRequestsHandler),
+    ("/tasks/changes/cleanup", CleanupChangeLogHandler)
+])